@@ -0,0 +1,171 @@
+import os
+import math
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException
+import orjson
+from auth import verify_token
+
+logger = logging.getLogger(__name__)
+
+# Admission control settings
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Requests being served at once by this worker before new ones get a 503
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "200"))
+# Per-user token buckets: sustained requests per second, and burst size
+READ_RATE = float(os.getenv("READ_RATE", "20"))
+READ_BURST = int(os.getenv("READ_BURST", "60"))
+WRITE_RATE = float(os.getenv("WRITE_RATE", "5"))
+WRITE_BURST = int(os.getenv("WRITE_BURST", "30"))
+ANALYTICS_RATE = float(os.getenv("ANALYTICS_RATE", "5"))
+ANALYTICS_BURST = int(os.getenv("ANALYTICS_BURST", "20"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+LIMITS: Dict[str, Tuple[float, int]] = {
+    "read": (READ_RATE, READ_BURST),
+    "write": (WRITE_RATE, WRITE_BURST),
+    "analytics": (ANALYTICS_RATE, ANALYTICS_BURST),
+}
+
+# Served without admission control: probes, scraping and long-lived event streams
+EXEMPT_PATHS = ("/health", "/ready", "/metrics", "/events")
+ANALYTICS_PATHS = ("/analytics", "/dashboard")
+
+
+class RateLimitBackend:
+    """Token bucket storage. Swap in a shared one (e.g. Redis) to limit across workers."""
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 if admitted, else seconds until a token is available."""
+        raise NotImplementedError
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process buckets, least recently used ones dropped past max_keys.
+
+    A dropped bucket comes back full, which only ever errs on the side of
+    admitting a request.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> (tokens, last refill time)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            wait = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            wait = (1 - tokens) / rate if rate > 0 else 60.0
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+def request_class(method: str, path: str) -> str:
+    if path.startswith(ANALYTICS_PATHS) or path.endswith("/analytics"):
+        return "analytics"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+
+def _client_key(scope) -> str:
+    """The user id from a valid bearer token, otherwise the client address."""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme == "Bearer" and token:
+                try:
+                    return f"user:{verify_token(token)['sub']}"
+                except (HTTPException, KeyError):
+                    # Still rejected by the route; limited by address here
+                    pass
+            break
+    client = scope.get("client")
+    return f"addr:{client[0] if client else 'unknown'}"
+
+
+class AdmissionStats:
+    def __init__(self):
+        self.admitted: Dict[str, int] = {name: 0 for name in LIMITS}
+        self.limited: Dict[str, int] = {name: 0 for name in LIMITS}
+        self.shed = 0
+        self.in_flight = 0
+
+
+class AdmissionMiddleware:
+    """ASGI middleware shedding load before it reaches Supabase.
+
+    Each caller has a token bucket per request class (read, write,
+    analytics) and is answered 429 once it's empty. Independently, at most
+    MAX_IN_FLIGHT requests are served at once; the excess is answered 503.
+    Both carry Retry-After.
+    """
+
+    def __init__(self, app, backend: Optional[RateLimitBackend] = None):
+        self.app = app
+        self.backend = backend if backend is not None else InMemoryRateLimitBackend()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not ADMISSION_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"].startswith(EXEMPT_PATHS)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        kind = request_class(scope["method"], scope["path"])
+        rate, burst = LIMITS[kind]
+        key = _client_key(scope)
+        try:
+            wait = await self.backend.take(f"{kind}:{key}", rate, burst)
+        except Exception as e:
+            # Fail open: a broken limiter shouldn't take the API down with it
+            logger.error("Rate limit backend failed: %s", e)
+            wait = 0.0
+        if wait > 0:
+            admission_stats.limited[kind] += 1
+            logger.debug("Rate limited %s %s request from %s", kind, scope["method"], key)
+            await _reject(send, 429, "Too many requests", wait)
+            return
+
+        if admission_stats.in_flight >= MAX_IN_FLIGHT:
+            admission_stats.shed += 1
+            await _reject(send, 503, "Server is busy", 1)
+            return
+
+        admission_stats.admitted[kind] += 1
+        admission_stats.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_stats.in_flight -= 1
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = orjson.dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# Exported by /metrics
+admission_stats = AdmissionStats()
@@ -1,20 +1,40 @@
-from fastapi import HTTPException, Header
+from fastapi import HTTPException, Header, Query
 from typing import Optional
-from database import supabase_client
 import logging
 import jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+import time
 import os
+from database import db
 
 logger = logging.getLogger(__name__)
 
 # JWT settings
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")  # In production, use a proper secret key
 JWT_ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+# Access tokens are short-lived and renewed locally with a refresh token,
+# so staying signed in never needs a round trip to the auth provider
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+# A session ends this long after signin, however often its tokens are renewed
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
-def create_access_token(user_id: str, email: str) -> str:
+# Verification caches
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+# token -> decoded payload, evicted LRU and dropped once the token's exp passes
+_verified_tokens: "OrderedDict[str, dict]" = OrderedDict()
+# user ids confirmed to exist in public.users
+_known_users: "OrderedDict[str, None]" = OrderedDict()
+
+def _session_expiry(auth_time: float) -> datetime:
+    return datetime.utcfromtimestamp(auth_time) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+def create_access_token(user_id: str, email: str, session_expires: Optional[datetime] = None) -> str:
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    if session_expires is not None:
+        expire = min(expire, session_expires)
     to_encode = {
         "sub": user_id,
         "email": email,
@@ -22,14 +42,109 @@ def create_access_token(user_id: str, email: str) -> str:
     }
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def create_refresh_token(user_id: str, email: str, auth_time: Optional[float] = None) -> str:
+    """A refresh token for the session started at `auth_time` (now by default)."""
+    auth_time = auth_time or time.time()
+    to_encode = {
+        "sub": user_id,
+        "email": email,
+        "type": "refresh",
+        "auth_time": auth_time,
+        "exp": _session_expiry(auth_time)
+    }
+    return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def issue_tokens(user_id: str, email: str, auth_time: Optional[float] = None) -> dict:
+    """A fresh access/refresh token pair, shaped like the Token response model.
+
+    Neither token outlives the session started at `auth_time` (now, for a signin).
+    """
+    auth_time = auth_time or time.time()
+    session_expires = _session_expiry(auth_time)
+    expires_in = min(ACCESS_TOKEN_EXPIRE_MINUTES * 60, int((session_expires - datetime.utcnow()).total_seconds()))
+    return {
+        "access_token": create_access_token(user_id, email, session_expires),
+        "refresh_token": create_refresh_token(user_id, email, auth_time),
+        "token_type": "bearer",
+        "expires_in": expires_in
+    }
+
+async def refresh_tokens(refresh_token: str) -> dict:
+    """Exchange a valid refresh token for a new pair, without calling the auth provider.
+
+    The pair stays in the refresh token's session, so it still ends
+    REFRESH_TOKEN_EXPIRE_DAYS after signin. One read of the user's row turns
+    away deleted users and sessions revoked by logout.
+    """
+    try:
+        payload = jwt.decode(refresh_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Refresh token has expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    
+    if payload.get("type") != "refresh" or not payload.get("auth_time"):
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    
+    user = await db.from_('users').select("tokens_valid_after").eq('id', payload["sub"]).execute()
+    if not user.data:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    valid_after = user.data[0].get('tokens_valid_after')
+    if valid_after and payload["auth_time"] <= datetime.fromisoformat(valid_after).timestamp():
+        raise HTTPException(status_code=401, detail="Session has been revoked")
+    return issue_tokens(payload["sub"], payload.get("email"), payload["auth_time"])
+
+async def revoke_sessions(user_id: str) -> None:
+    """Stop every refresh token issued to the user so far.
+
+    Access tokens already out keep working until they expire, at most
+    ACCESS_TOKEN_EXPIRE_MINUTES later.
+    """
+    await db.from_('users')\
+        .update({'tokens_valid_after': datetime.now(timezone.utc).isoformat()})\
+        .eq('id', user_id)\
+        .execute()
+
 def verify_token(token: str) -> dict:
+    payload = _verified_tokens.get(token)
+    if payload is not None:
+        if payload["exp"] > time.time():
+            _verified_tokens.move_to_end(token)
+            return payload
+        del _verified_tokens[token]
+        raise HTTPException(status_code=401, detail="Token has expired")
+    
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
+    
+    # Refresh tokens are only good for /auth/refresh
+    if payload.get("type") == "refresh":
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    
+    if "exp" in payload:
+        _verified_tokens[token] = payload
+        if len(_verified_tokens) > TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return payload
+
+async def user_exists(user_id: str) -> bool:
+    """Check that the user has a row in public.users, remembering positive answers."""
+    if user_id in _known_users:
+        _known_users.move_to_end(user_id)
+        return True
+    
+    user = await db.from_('users').select("id").eq('id', user_id).execute()
+    if not user.data:
+        return False
+    
+    _known_users[user_id] = None
+    if len(_known_users) > USER_CACHE_SIZE:
+        _known_users.popitem(last=False)
+    return True
 
 async def get_current_user(authorization: Optional[str] = Header(None)) -> str:
     if not authorization or not authorization.startswith("Bearer "):
@@ -40,5 +155,17 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> str:
         payload = verify_token(token)
         return payload["sub"]  # This is the user_id
     except Exception as e:
-        logger.error(f"Error verifying token: {str(e)}")
-        raise HTTPException(status_code=401, detail="Could not validate credentials") 
\ No newline at end of file
+        logger.error("Error verifying token: %s", e)
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+async def get_stream_user(
+    authorization: Optional[str] = Header(None),
+    access_token: Optional[str] = Query(None)
+) -> str:
+    """Like get_current_user, but also accepts `?access_token=` for EventSource clients,
+    which cannot set an Authorization header."""
+    if authorization:
+        return await get_current_user(authorization)
+    if not access_token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+    return await get_current_user(f"Bearer {access_token}")
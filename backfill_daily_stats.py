@@ -0,0 +1,52 @@
+import sys
+import time
+import argparse
+import logging
+from run_migrations import get_client
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill_daily_stats(batch_size: int = 500, after: str | None = None) -> bool:
+    """Rebuild habit_daily_stats from habit_entries, `batch_size` habits per call.
+
+    Each batch is one transaction on the server and is safe to re-run, so an
+    interrupted backfill can resume from the last habit id it logged.
+    """
+    try:
+        supabase = get_client()
+        started = time.monotonic()
+        batches = 0
+
+        while True:
+            response = supabase.rpc('backfill_habit_daily_stats', {
+                'p_after': after,
+                'p_batch_size': batch_size
+            }).execute()
+            if not response.data:
+                break
+            after = response.data
+            batches += 1
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"Batch {batches} done through habit {after} "
+                f"({batches * batch_size / elapsed:.0f} habits/s)"
+            )
+
+        logger.info(f"Backfill completed: {batches} batch(es) in {time.monotonic() - started:.1f}s")
+        return True
+    except Exception as e:
+        logger.error(f"Backfill failed after habit {after}: {str(e)}")
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the habit_daily_stats rollup for existing entries")
+    parser.add_argument("--batch-size", type=int, default=500, help="habits rebuilt per round trip")
+    parser.add_argument("--after", help="resume after this habit id")
+    args = parser.parse_args()
+
+    if not backfill_daily_stats(batch_size=args.batch_size, after=args.after):
+        sys.exit(1)
@@ -0,0 +1,605 @@
+"""In-process stand-in for the parts of Supabase this service talks to.
+
+Implements enough of PostgREST (filters, ordering, keyset `or`, limits,
+inserts, updates, deletes and the RPCs defined in migrations/) and of the
+GoTrue auth API for every route in routes/ to run against it. Every HTTP
+request is counted so benchmarks can report database round trips.
+"""
+import json
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+# Primary key and secondary indexes per table
+TABLES = {
+    "users": (("id",), ("username", "email")),
+    "habits": (("id",), ("user_id",)),
+    "habit_entries": (("id",), ("habit_id", "user_id")),
+    "habit_daily_stats": (("habit_id", "day"), ("user_id", "habit_id")),
+    "streak_resets": (("id",), ()),
+}
+
+_DATE_ONLY = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _norm(value: Any) -> Any:
+    # Postgres compares a bare date against a timestamptz as midnight UTC
+    if isinstance(value, str) and _DATE_ONLY.match(value):
+        return value + "T00:00:00+00:00"
+    return value
+
+
+def _coerce(raw: str, like: Any) -> Any:
+    if raw == "null":
+        return None
+    if isinstance(like, bool):
+        return raw == "true"
+    if isinstance(like, int):
+        return int(raw)
+    if isinstance(like, float):
+        return float(raw)
+    return raw
+
+
+def _split_top(text: str) -> List[str]:
+    """Split a PostgREST logic-tree list on commas outside parens and quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _matches(row: Dict, column: str, op: str, raw: str) -> bool:
+    if op == "not":
+        op, raw = raw.split(".", 1)
+        return not _matches(row, column, op, raw)
+    value = row.get(column)
+    if op == "is":
+        return value is None if raw == "null" else value == (raw == "true")
+    if op == "in":
+        options = [o.strip('"') for o in _split_top(raw.strip("()"))]
+        return str(value) in options
+    if value is None:
+        return False
+    raw = raw.strip('"')
+    target = _coerce(raw, value)
+    left, right = _norm(value), _norm(target)
+    if op == "eq":
+        return left == right
+    if op == "neq":
+        return left != right
+    if op == "gt":
+        return left > right
+    if op == "gte":
+        return left >= right
+    if op == "lt":
+        return left < right
+    if op == "lte":
+        return left <= right
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+def _logic(row: Dict, expression: str, combine: Callable) -> bool:
+    results = []
+    for part in _split_top(expression):
+        if part.startswith("and("):
+            results.append(_logic(row, part[4:-1], all))
+        elif part.startswith("or("):
+            results.append(_logic(row, part[3:-1], any))
+        else:
+            column, op, raw = part.split(".", 2)
+            results.append(_matches(row, column, op, raw))
+    return combine(results)
+
+
+class FakeSupabase:
+    """Row store plus the HTTP surface the app's Supabase clients use."""
+
+    def __init__(self):
+        self.rows: Dict[str, Dict[Tuple, Dict]] = {name: {} for name in TABLES}
+        self.indexes: Dict[str, Dict[str, Dict[Any, Dict[Tuple, Dict]]]] = {
+            name: {col: defaultdict(dict) for col in cols} for name, (_, cols) in TABLES.items()
+        }
+        self.auth_users: Dict[str, Dict] = {}  # email -> auth user
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        self.round_trips_by_path: Dict[str, int] = defaultdict(int)
+        self.rpcs: Dict[str, Callable[[Dict], Any]] = {
+            "analytics_summary": self.rpc_analytics_summary,
+            "habit_performance": self.rpc_habit_performance,
+            "backfill_habit_daily_stats": self.rpc_backfill_habit_daily_stats,
+            "habit_calendar_days": self.rpc_habit_calendar_days,
+            "delete_habit": self.rpc_delete_habit,
+            "purge_archived_entries": self.rpc_purge_archived_entries,
+            "reconcile_streaks": self.rpc_reconcile_streaks,
+            "exec_sql": lambda params: None,
+        }
+        self.app = Starlette(middleware=[Middleware(_CountingMiddleware, fake=self)], routes=[
+            Route("/rest/v1/rpc/{fn}", self.handle_rpc, methods=["POST"]),
+            Route("/rest/v1/{table}", self.handle_table, methods=["GET", "POST", "PATCH", "DELETE"]),
+            Route("/auth/v1/signup", self.handle_signup, methods=["POST"]),
+            Route("/auth/v1/token", self.handle_token, methods=["POST"]),
+            Route("/auth/v1/admin/users/{user_id}", self.handle_admin_delete, methods=["DELETE"]),
+        ])
+
+    # Storage
+
+    def _key(self, table: str, row: Dict) -> Tuple:
+        return tuple(row[col] for col in TABLES[table][0])
+
+    def insert_row(self, table: str, row: Dict) -> Dict:
+        key = self._key(table, row)
+        if key in self.rows[table]:
+            raise _Conflict(f"duplicate key value violates unique constraint on {table}")
+        self.rows[table][key] = row
+        for col, index in self.indexes[table].items():
+            index[row.get(col)][key] = row
+        if table == "habit_entries":
+            self._apply_daily_stats(row, 1)
+        return row
+
+    def delete_row(self, table: str, row: Dict) -> None:
+        key = self._key(table, row)
+        self.rows[table].pop(key, None)
+        for col, index in self.indexes[table].items():
+            index[row.get(col)].pop(key, None)
+        if table == "habit_entries":
+            self._apply_daily_stats(row, -1)
+        if table == "habits":
+            # ON DELETE CASCADE from habit_entries and habit_daily_stats
+            for entry in list(self.indexes["habit_entries"]["habit_id"][row["id"]].values()):
+                self.delete_row("habit_entries", entry)
+            for stat in list(self.indexes["habit_daily_stats"]["habit_id"][row["id"]].values()):
+                self.delete_row("habit_daily_stats", stat)
+
+    def update_row(self, table: str, row: Dict, changes: Dict) -> Dict:
+        if table == "habits":
+            # Mirrors the habits_set_updated_at trigger
+            changes = {**changes, "updated_at": now_iso()}
+        key = self._key(table, row)
+        for col, index in self.indexes[table].items():
+            if col in changes:
+                index[row.get(col)].pop(key, None)
+                index[changes[col]][key] = row
+        row.update(changes)
+        return row
+
+    def _apply_daily_stats(self, entry: Dict, delta: int) -> None:
+        # Mirrors the habit_entries_daily_stats trigger
+        day = entry["completed_at"][:10]
+        stat = self.rows["habit_daily_stats"].get((entry["habit_id"], day))
+        if stat is None:
+            if delta > 0:
+                self.insert_row("habit_daily_stats", {
+                    "habit_id": entry["habit_id"], "day": day,
+                    "user_id": entry["user_id"], "completions": delta,
+                })
+            return
+        stat["completions"] += delta
+        if stat["completions"] <= 0:
+            self.delete_row("habit_daily_stats", stat)
+
+    def _defaults(self, table: str, row: Dict) -> Dict:
+        row = dict(row)
+        if table in ("users", "habits", "habit_entries"):
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", now_iso())
+        if table in ("users", "habits"):
+            row.setdefault("updated_at", row["created_at"])
+        if table == "habits":
+            row.setdefault("description", None)
+            row.setdefault("is_archived", False)
+            row.setdefault("archived_at", None)
+            row.setdefault("reminder_time", None)
+            row.setdefault("streak_count", 0)
+            row.setdefault("longest_streak", 0)
+            row.setdefault("last_completed_date", None)
+        if table == "habit_entries":
+            row["completed_at"] = _norm(row["completed_at"])
+        return row
+
+    # Query evaluation
+
+    def select(self, table: str, params: List[Tuple[str, str]]) -> List[Dict]:
+        filters, logic, order, limit, offset = [], [], None, None, 0
+        for name, value in params:
+            if name in ("select", "columns", "on_conflict"):
+                continue
+            if name == "order":
+                order = value
+            elif name == "limit":
+                limit = int(value)
+            elif name == "offset":
+                offset = int(value)
+            elif name in ("or", "and"):
+                logic.append((name, value.strip()[1:-1]))
+            else:
+                op, raw = value.split(".", 1)
+                filters.append((name, op, raw))
+
+        candidates = None
+        for column, op, raw in filters:
+            if op == "eq" and column in self.indexes[table]:
+                candidates = list(self.indexes[table][column].get(raw, {}).values())
+                break
+            if op == "in" and column in self.indexes[table]:
+                index = self.indexes[table][column]
+                options = [o.strip('"') for o in _split_top(raw.strip("()"))]
+                candidates = [row for o in options for row in index.get(o, {}).values()]
+                break
+        if candidates is None:
+            candidates = list(self.rows[table].values())
+
+        rows = [
+            row for row in candidates
+            if all(_matches(row, c, op, raw) for c, op, raw in filters)
+            and all(_logic(row, expr, any if kind == "or" else all) for kind, expr in logic)
+        ]
+
+        if order:
+            for term in reversed(order.split(",")):
+                column, *flags = term.split(".")
+                rows.sort(
+                    key=lambda r: (r.get(column) is None, _norm(r.get(column)) if r.get(column) is not None else 0),
+                    reverse="desc" in flags,
+                )
+        rows = rows[offset:]
+        if limit is not None:
+            rows = rows[:limit]
+        return rows
+
+    @staticmethod
+    def project(rows: List[Dict], params: List[Tuple[str, str]]) -> List[Dict]:
+        select = dict(params).get("select", "*")
+        if select == "*":
+            return [dict(r) for r in rows]
+        columns = [c.strip() for c in select.split(",")]
+        return [{c: r.get(c) for c in columns} for r in rows]
+
+    # PostgREST endpoints
+
+    async def handle_table(self, request: Request) -> Response:
+        table = request.path_params["table"]
+        if table not in TABLES:
+            return JSONResponse({"message": f"relation {table} does not exist"}, status_code=404)
+        params = list(request.query_params.multi_items())
+        prefer = request.headers.get("prefer", "")
+        # Read the body before taking the lock; awaiting while holding it would stall the loop
+        body = await request.body()
+
+        try:
+            with self.lock:
+                if request.method == "GET":
+                    rows = self.select(table, params)
+                    status = 200
+                elif request.method == "POST":
+                    payload = json.loads(body)
+                    rows = self._insert(table, payload if isinstance(payload, list) else [payload], params, prefer)
+                    status = 201
+                elif request.method == "PATCH":
+                    changes = json.loads(body)
+                    rows = [self.update_row(table, r, changes) for r in self.select(table, params)]
+                    status = 200
+                else:
+                    rows = self.select(table, params)
+                    for row in rows:
+                        self.delete_row(table, row)
+                    status = 200
+                data = self.project(rows, params)
+                if "count=exact" in prefer:
+                    # PostgREST counts every matching row, not just the page
+                    total = len(self.select(table, [(k, v) for k, v in params if k not in ("limit", "offset")]))
+        except _Conflict as e:
+            return JSONResponse({"code": "23505", "message": str(e)}, status_code=409)
+
+        headers = {}
+        if "count=exact" in prefer:
+            headers["Content-Range"] = f"0-{max(len(data) - 1, 0)}/{total}"
+        if "return=minimal" in prefer:
+            return Response(status_code=status if status != 200 else 204, headers=headers)
+        return JSONResponse(data, status_code=status, headers=headers)
+
+    def _insert(self, table: str, rows: List[Dict], params, prefer: str) -> List[Dict]:
+        conflict_cols = dict(params).get("on_conflict")
+        inserted = []
+        for row in rows:
+            row = self._defaults(table, row)
+            if conflict_cols:
+                cols = [c.strip() for c in conflict_cols.split(",")]
+                existing = [
+                    r for r in self.rows[table].values()
+                    if all(_norm(r.get(c)) == _norm(row.get(c)) for c in cols)
+                ]
+                if existing:
+                    if "resolution=merge-duplicates" in prefer:
+                        inserted.append(self.update_row(table, existing[0], row))
+                    continue
+            inserted.append(self.insert_row(table, row))
+        return inserted
+
+    async def handle_rpc(self, request: Request) -> Response:
+        fn = request.path_params["fn"]
+        if fn not in self.rpcs:
+            return JSONResponse({"message": f"function {fn} does not exist"}, status_code=404)
+        body = await request.body()
+        with self.lock:
+            result = self.rpcs[fn](json.loads(body) if body else {})
+        return JSONResponse(result)
+
+    # RPCs from migrations/
+
+    def rpc_analytics_summary(self, params: Dict) -> List[Dict]:
+        user_id = params["p_user_id"]
+        habits = list(self.indexes["habits"]["user_id"].get(user_id, {}).values())
+        stats = self.indexes["habit_daily_stats"]["user_id"].get(user_id, {}).values()
+        return [{
+            "total_habits": len(habits),
+            "active_habits": sum(1 for h in habits if not h.get("is_archived")),
+            "total_entries": sum(s["completions"] for s in stats),
+            "current_streak": max((h["streak_count"] or 0 for h in habits), default=0),
+            "longest_streak": max((h["longest_streak"] or 0 for h in habits), default=0),
+        }]
+
+    def rpc_habit_performance(self, params: Dict) -> List[Dict]:
+        user_id, start, end = params["p_user_id"], params["p_start"], params["p_end"]
+        category = params.get("p_category")
+        result = []
+        for habit in self.indexes["habits"]["user_id"].get(user_id, {}).values():
+            if category is not None and habit["category"] != category:
+                continue
+            stats = self.indexes["habit_daily_stats"]["habit_id"].get(habit["id"], {}).values()
+            result.append({
+                "id": habit["id"],
+                "name": habit["name"],
+                "category": habit["category"],
+                "streak_count": habit["streak_count"] or 0,
+                "longest_streak": habit["longest_streak"] or 0,
+                "completions": sum(s["completions"] for s in stats if start <= s["day"] <= end),
+            })
+        return result
+
+    def rpc_habit_calendar_days(self, params: Dict) -> List[Dict]:
+        user_id, start, end = params["p_user_id"], params["p_start"], params["p_end"]
+        result = []
+        for habit_id in params["p_habit_ids"]:
+            days = sorted(
+                s["day"] for s in self.indexes["habit_daily_stats"]["habit_id"].get(habit_id, {}).values()
+                if s["user_id"] == user_id and start <= s["day"] <= end
+            )
+            if days:
+                result.append({"habit_id": habit_id, "days": days})
+        return result
+
+    def rpc_backfill_habit_daily_stats(self, params: Dict) -> Optional[str]:
+        after, batch_size = params.get("p_after"), params["p_batch_size"]
+        ids = sorted(h for (h,) in self.rows["habits"] if after is None or h > after)[:batch_size]
+        return ids[-1] if ids else None
+
+    def rpc_delete_habit(self, params: Dict) -> bool:
+        habit = self.rows["habits"].get((params["p_habit_id"],))
+        if habit is None or habit["user_id"] != params["p_user_id"]:
+            return False
+        self.delete_row("habits", habit)
+        return True
+
+    def rpc_purge_archived_entries(self, params: Dict) -> List[Dict]:
+        before, batch_size = _norm(params["p_archived_before"]), params["p_batch_size"]
+        purged: Dict[str, int] = defaultdict(int)
+        for habit in list(self.rows["habits"].values()):
+            if not habit["is_archived"] or not habit.get("archived_at") or _norm(habit["archived_at"]) >= before:
+                continue
+            for entry in list(self.indexes["habit_entries"]["habit_id"][habit["id"]].values()):
+                if sum(purged.values()) >= batch_size:
+                    break
+                self.delete_row("habit_entries", entry)
+                purged[entry["user_id"]] += 1
+        return [{"user_id": user_id, "purged": count} for user_id, count in purged.items()]
+
+    def rpc_reconcile_streaks(self, params: Dict) -> List[Dict]:
+        after, before = params.get("p_after"), params.get("p_before")
+        yesterday = (date.fromisoformat(params["p_today"]) - timedelta(days=1)).isoformat()
+        batch = sorted(
+            (h for h in self.rows["habits"].values()
+             if not h["is_archived"]
+             and (after is None or h["id"] > after)
+             and (before is None or h["id"] < before)),
+            key=lambda h: h["id"],
+        )[:params["p_batch_size"]]
+        reset, users = 0, set()
+        for habit in batch:
+            last = habit.get("last_completed_date")
+            if habit["streak_count"] and last is not None and last < yesterday:
+                self.update_row("habits", habit, {"streak_count": 0})
+                reset += 1
+                users.add(habit["user_id"])
+        if reset:
+            # Mirrors the marker update in reconcile_streaks
+            self.rows["streak_resets"][(True,)] = {"id": True, "reset_at": now_iso()}
+        return [{
+            "last_id": batch[-1]["id"] if batch else None, "scanned": len(batch),
+            "reset_count": reset, "reset_user_ids": sorted(users),
+        }]
+
+    # GoTrue endpoints
+
+    async def handle_signup(self, request: Request) -> Response:
+        body = json.loads(await request.body())
+        with self.lock:
+            if body["email"] in self.auth_users:
+                return JSONResponse({"code": 400, "msg": "User already registered"}, status_code=400)
+            metadata = body.get("data") or {}
+            username = (metadata.get("username") or "").strip() or body["email"].split("@")[0]
+            # Mirrors the on_auth_user_created trigger and the unique username and email constraints
+            if self.indexes["users"]["username"].get(username) or self.indexes["users"]["email"].get(body["email"].lower()):
+                return JSONResponse({"code": 500, "msg": "Database error saving new user"}, status_code=500)
+            user = self.create_auth_user(body["email"], body["password"], metadata)
+            self.insert_row("users", self._defaults("users", {
+                "id": user["id"], "username": username, "email": body["email"].lower(),
+            }))
+        return JSONResponse(self._public_user(user))
+
+    async def handle_token(self, request: Request) -> Response:
+        body = json.loads(await request.body())
+        user = self.auth_users.get(body.get("email"))
+        if user is None or user["password"] != body.get("password"):
+            return JSONResponse(
+                {"error": "invalid_grant", "error_description": "Invalid login credentials"},
+                status_code=400,
+            )
+        return JSONResponse({
+            "access_token": "fake-access-token",
+            "refresh_token": "fake-refresh-token",
+            "expires_in": 3600,
+            "expires_at": int(time.time()) + 3600,
+            "token_type": "bearer",
+            "user": self._public_user(user),
+        })
+
+    async def handle_admin_delete(self, request: Request) -> Response:
+        user_id = request.path_params["user_id"]
+        with self.lock:
+            for email, user in list(self.auth_users.items()):
+                if user["id"] == user_id:
+                    del self.auth_users[email]
+        return JSONResponse({})
+
+    def create_auth_user(self, email: str, password: str, metadata: Dict, user_id: Optional[str] = None) -> Dict:
+        user = {
+            "id": user_id or str(uuid.uuid4()),
+            "email": email,
+            "password": password,
+            "user_metadata": metadata,
+            "created_at": now_iso(),
+        }
+        self.auth_users[email] = user
+        return user
+
+    @staticmethod
+    def _public_user(user: Dict) -> Dict:
+        return {
+            "id": user["id"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": user["email"],
+            "app_metadata": {"provider": "email"},
+            "user_metadata": user["user_metadata"],
+            "created_at": user["created_at"],
+        }
+
+
+class _Conflict(Exception):
+    pass
+
+
+class _CountingMiddleware:
+    def __init__(self, app, fake: FakeSupabase):
+        self.app = app
+        self.fake = fake
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.fake.round_trips += 1
+            self.fake.round_trips_by_path[scope["path"]] += 1
+        await self.app(scope, receive, send)
+
+
+def seed(
+    fake: FakeSupabase,
+    users: int,
+    habits_per_user: int,
+    days: int,
+    completion_rate: float,
+    rng,
+) -> List[Dict]:
+    """Fill the store with users, habits and `days` of history ending yesterday.
+
+    Returns one dict per user with its id, credentials and habit ids.
+    """
+    from streaks import recompute_streak
+
+    categories = ["health", "fitness", "learning", "mindfulness", "productivity"]
+    today = date.today()
+    first_day = today - timedelta(days=days)
+    seeded = []
+    for u in range(users):
+        email = f"bench-user-{u}@example.com"
+        auth_user = fake.create_auth_user(email, "bench-password", {"username": f"bench{u}"})
+        fake.insert_row("users", fake._defaults("users", {
+            "id": auth_user["id"], "username": f"bench{u}", "email": email,
+        }))
+        habit_ids = []
+        for h in range(habits_per_user):
+            habit = fake._defaults("habits", {
+                "user_id": auth_user["id"],
+                "name": f"Habit {h}",
+                "category": categories[h % len(categories)],
+                "color": "#4f46e5",
+                "created_at": f"{first_day.isoformat()}T00:00:00+00:00",
+            })
+            fake.insert_row("habits", habit)
+            completed = []
+            for offset in range(days):
+                if rng.random() < completion_rate:
+                    day = first_day + timedelta(days=offset)
+                    completed.append(day)
+                    fake.insert_row("habit_entries", fake._defaults("habit_entries", {
+                        "habit_id": habit["id"],
+                        "user_id": auth_user["id"],
+                        "completed_at": day.isoformat(),
+                    }))
+            streak, longest, last = recompute_streak(completed)
+            habit.update({
+                "streak_count": streak,
+                "longest_streak": longest,
+                "last_completed_date": last.isoformat() if last else None,
+            })
+            habit_ids.append(habit["id"])
+        seeded.append({"id": auth_user["id"], "email": email, "password": "bench-password", "habits": habit_ids})
+    return seeded
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(fake: FakeSupabase) -> Tuple[str, uvicorn.Server]:
+    """Run the fake on a localhost port in a background thread and return its URL."""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        fake.app, host="127.0.0.1", port=port, log_level="warning", access_log=False
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}", server
@@ -0,0 +1,344 @@
+"""Load-test every route against the in-process Supabase stand-in.
+
+    python -m bench.run_bench --users 200 --habits 3 --days 365 --requests 500 --concurrency 50
+
+Seeds a FakeSupabase with the requested dataset, serves it on localhost so
+the app's pooled HTTP clients are exercised for real, then drives each route
+concurrently through the ASGI app and reports latency percentiles,
+throughput and database round trips per request.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_supabase import FakeSupabase, seed, serve_in_thread  # noqa: E402
+
+
+@dataclass
+class Result:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[int, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+    round_trips: int = 0
+
+    @property
+    def errors(self) -> int:
+        return sum(count for status, count in self.statuses.items() if status >= 400)
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[int(round(q * (len(ordered) - 1)))] * 1000
+
+    def as_dict(self) -> Dict:
+        count = len(self.latencies)
+        return {
+            "scenario": self.name,
+            "requests": count,
+            "errors": self.errors,
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "throughput_rps": round(count / self.elapsed, 1) if self.elapsed else 0.0,
+            "db_round_trips_per_request": round(self.round_trips / count, 2) if count else 0.0,
+            "statuses": self.statuses,
+        }
+
+
+async def run_scenario(
+    name: str,
+    call: Callable[[int], Awaitable],
+    requests: int,
+    concurrency: int,
+    fake: FakeSupabase,
+) -> Result:
+    result = Result(name)
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await call(i)
+                status = response.status_code
+            except Exception:
+                status = 599
+            result.latencies.append(time.perf_counter() - started)
+            result.statuses[status] = result.statuses.get(status, 0) + 1
+
+    round_trips_before = fake.round_trips
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    result.round_trips = fake.round_trips - round_trips_before
+    return result
+
+
+def build_scenarios(client, users: List[Dict], tokens: Dict[str, Dict], rng: random.Random) -> List:
+    created_habits: List[tuple] = []
+    today = date.today().isoformat()
+
+    def pick():
+        user = rng.choice(users)
+        return user, tokens[user["id"]], rng.choice(user["habits"])
+
+    async def signup(i):
+        suffix = f"{i}-{rng.randrange(10 ** 9)}"
+        return await client.post("/auth/signup", json={
+            "username": f"new{suffix}", "email": f"new-{suffix}@example.com", "password": "pw-123456",
+        })
+
+    async def signin(i):
+        user = rng.choice(users)
+        return await client.post("/auth/signin", data={"username": user["email"], "password": user["password"]})
+
+    async def refresh(i):
+        from auth import create_refresh_token
+        user = rng.choice(users)
+        return await client.post("/auth/refresh", json={
+            "refresh_token": create_refresh_token(user["id"], user["email"]),
+        })
+
+    async def list_habits(i):
+        user, headers, _ = pick()
+        return await client.get("/habits/", headers=headers)
+
+    async def revalidate_summary(i):
+        # Clients replaying the ETag they were given get a bodiless 304
+        _, headers, _ = pick()
+        first = await client.get("/analytics/summary", headers=headers)
+        etag = first.headers.get("ETag")
+        if not etag:
+            return first
+        return await client.get("/analytics/summary", headers={**headers, "If-None-Match": etag})
+
+    async def export(i):
+        _, headers, _ = pick()
+        fmt = "csv" if i % 2 else "ndjson"
+        return await client.get(f"/habits/export?format={fmt}", headers=headers)
+
+    async def create_habit(i):
+        user, headers, _ = pick()
+        response = await client.post("/habits/", headers=headers, json={
+            "name": f"Bench habit {i}", "category": "fitness", "color": "#10b981",
+        })
+        if response.status_code == 200:
+            created_habits.append((headers, response.json()["id"]))
+        return response
+
+    async def update_habit(i):
+        _, headers, habit_id = pick()
+        return await client.patch(f"/habits/{habit_id}", headers=headers, json={
+            "reminder_time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+        })
+
+    async def check_in(i):
+        _, headers, habit_id = pick()
+        return await client.post(f"/habits/{habit_id}/entries", headers=headers, json={"date": today})
+
+    async def check_in_backdated(i):
+        _, headers, habit_id = pick()
+        day = (date.today() - timedelta(days=rng.randrange(1, 60))).isoformat()
+        return await client.post(f"/habits/{habit_id}/entries", headers=headers, json={"date": day})
+
+    async def check_in_batch(i):
+        # An offline client syncing a month of check-ins across all of its habits
+        user, headers, _ = pick()
+        entries = [
+            {"habit_id": habit_id, "date": (date.today() - timedelta(days=d)).isoformat()}
+            for habit_id in user["habits"]
+            for d in range(30)
+            if rng.random() < 0.7
+        ]
+        return await client.post("/habits/entries:batch", headers=headers, json={"entries": entries})
+
+    async def list_entries(i):
+        _, headers, habit_id = pick()
+        return await client.get(f"/habits/{habit_id}/entries", headers=headers)
+
+    async def summary(i):
+        _, headers, _ = pick()
+        return await client.get("/analytics/summary", headers=headers)
+
+    async def performance(i):
+        _, headers, _ = pick()
+        window = rng.choice([7, 30, 90, 365])
+        return await client.get(f"/analytics/performance?window_days={window}", headers=headers)
+
+    async def history(i):
+        _, headers, _ = pick()
+        return await client.get("/analytics/history?days=90", headers=headers)
+
+    async def dashboard(i):
+        _, headers, _ = pick()
+        return await client.get("/dashboard/", headers=headers)
+
+    async def dashboard_tabs(i):
+        # The same user opening the home screen in several tabs at once
+        _, headers, _ = pick()
+        responses = await asyncio.gather(*(client.get("/dashboard/", headers=headers) for _ in range(4)))
+        return max(responses, key=lambda r: r.status_code)
+
+    async def calendar(i):
+        _, headers, habit_id = pick()
+        return await client.get(f"/habits/{habit_id}/calendar", headers=headers)
+
+    async def calendars(i):
+        _, headers, _ = pick()
+        return await client.get("/habits/calendar?encoding=rle", headers=headers)
+
+    async def habit_analytics(i):
+        _, headers, habit_id = pick()
+        return await client.get(f"/habits/{habit_id}/analytics", headers=headers)
+
+    async def archive_habit(i):
+        # Archive and restore habits created by the bench so later scenarios see the seeded data
+        if not created_habits:
+            _, headers, habit_id = pick()
+            return await client.post(f"/habits/{habit_id}/unarchive", headers=headers)
+        headers, habit_id = created_habits[i % len(created_habits)]
+        action = "archive" if i % 2 == 0 else "unarchive"
+        return await client.post(f"/habits/{habit_id}/{action}", headers=headers)
+
+    async def delete_habit(i):
+        if not created_habits:
+            _, headers, habit_id = pick()
+            return await client.delete(f"/habits/{habit_id}", headers=headers)
+        headers, habit_id = created_habits.pop()
+        return await client.delete(f"/habits/{habit_id}", headers=headers)
+
+    async def logout(i):
+        _, headers, _ = pick()
+        return await client.post("/auth/logout", headers=headers)
+
+    async def test_connection(i):
+        return await client.get("/auth/test-connection")
+
+    return [
+        ("POST /auth/signup", signup),
+        ("POST /auth/signin", signin),
+        ("POST /auth/refresh", refresh),
+        ("GET /habits/", list_habits),
+        ("POST /habits/", create_habit),
+        ("PATCH /habits/{id}", update_habit),
+        ("POST /habits/{id}/entries", check_in),
+        ("POST /habits/{id}/entries (back-dated)", check_in_backdated),
+        ("POST /habits/entries:batch", check_in_batch),
+        ("GET /habits/{id}/entries", list_entries),
+        ("GET /habits/export", export),
+        ("GET /analytics/summary", summary),
+        ("GET /analytics/performance", performance),
+        ("GET /analytics/history", history),
+        ("GET /analytics/summary (If-None-Match)", revalidate_summary),
+        ("GET /dashboard/", dashboard),
+        ("GET /dashboard/ (4 tabs at once)", dashboard_tabs),
+        ("GET /habits/{id}/calendar", calendar),
+        ("GET /habits/calendar", calendars),
+        ("GET /habits/{id}/analytics", habit_analytics),
+        ("POST /habits/{id}/archive", archive_habit),
+        ("DELETE /habits/{id}", delete_habit),
+        ("POST /auth/logout", logout),
+        ("GET /auth/test-connection", test_connection),
+    ]
+
+
+async def main(args) -> List[Result]:
+    rng = random.Random(args.seed)
+    fake = FakeSupabase()
+
+    started = time.perf_counter()
+    users = seed(fake, args.users, args.habits, args.days, args.completion_rate, rng)
+    entries = len(fake.rows["habit_entries"])
+    print(f"Seeded {args.users} users, {args.users * args.habits} habits, {entries} entries "
+          f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    url, server = serve_in_thread(fake)
+    os.environ.update({
+        "SUPABASE_URL": url,
+        "SUPABASE_KEY": "bench.service.key",
+    })
+    # Background purges would add round trips to whichever scenario is running
+    os.environ.setdefault("PURGE_ENABLED", "false")
+    if not args.admission:
+        # Every bench request comes from one address at a far higher rate than a real client
+        os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+    # The app reads its configuration at import time
+    import httpx
+    started = time.perf_counter()
+    import main as app_main
+    imported = time.perf_counter()
+    from auth import create_access_token
+    from cache import analytics_cache, InMemoryBackend
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.no_cache:
+        analytics_cache.backend = InMemoryBackend(max_size=0)
+
+    tokens = {
+        user["id"]: {"Authorization": f"Bearer {create_access_token(user['id'], user['email'])}"}
+        for user in users
+    }
+
+    results = []
+    transport = httpx.ASGITransport(app=app_main.app)
+    # ASGITransport doesn't send lifespan events, so run the app's lifespan here
+    async with app_main.app.router.lifespan_context(app_main.app):
+        print(f"App started in {time.perf_counter() - started:.3f}s "
+              f"(import {imported - started:.3f}s)", file=sys.stderr)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name, call in build_scenarios(client, users, tokens, rng):
+                if args.only and not any(token in name for token in args.only):
+                    continue
+                result = await run_scenario(name, call, args.requests, args.concurrency, fake)
+                results.append(result)
+                print(f"  {name}: done", file=sys.stderr)
+
+    server.should_exit = True
+    return results
+
+
+def report(results: List[Result], as_json: bool) -> None:
+    rows = [r.as_dict() for r in results]
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return
+    header = f"{'scenario':<42}{'reqs':>6}{'errs':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'db/req':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['scenario']:<42}{row['requests']:>6}{row['errors']:>6}"
+            f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+            f"{row['throughput_rps']:>9.1f}{row['db_round_trips_per_request']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every route against a fake Supabase backend")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--habits", type=int, default=3, help="habits per user")
+    parser.add_argument("--days", type=int, default=365, help="days of history per habit")
+    parser.add_argument("--completion-rate", type=float, default=0.7)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="disable the analytics result cache")
+    parser.add_argument("--admission", action="store_true", help="keep per-user rate limits and the in-flight cap on")
+    parser.add_argument("--only", nargs="*", help="run scenarios whose name contains any of these")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    report(asyncio.run(main(args)), args.json)
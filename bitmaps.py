@@ -0,0 +1,58 @@
+import base64
+from calendar import isleap
+from datetime import date, timedelta
+from typing import Iterable, List
+
+# A year of completions is one bit per day: bit i is set when the habit was
+# completed on day i of the year (Jan 1 is bit 0). Bits are packed
+# little-endian, so bit i lives in byte i // 8 at position i % 8.
+
+
+def days_in_year(year: int) -> int:
+    return 366 if isleap(year) else 365
+
+
+def build_year_bitmap(year: int, days: Iterable[date]) -> bytes:
+    bits = bytearray((days_in_year(year) + 7) // 8)
+    start = date(year, 1, 1)
+    for day in days:
+        if day.year == year:
+            i = (day - start).days
+            bits[i // 8] |= 1 << (i % 8)
+    return bytes(bits)
+
+
+def encode_base64(bitmap: bytes) -> str:
+    return base64.b64encode(bitmap).decode()
+
+
+def encode_rle(bitmap: bytes, n_days: int) -> List[int]:
+    """Alternating run lengths, starting with a (possibly empty) run of missed days."""
+    value = int.from_bytes(bitmap, "little")
+    runs: List[int] = []
+    current, length = 0, 0
+    for i in range(n_days):
+        bit = (value >> i) & 1
+        if bit == current:
+            length += 1
+        else:
+            runs.append(length)
+            current, length = bit, 1
+    runs.append(length)
+    return runs
+
+
+def bitmap_days(year: int, bitmap: bytes) -> List[date]:
+    value = int.from_bytes(bitmap, "little")
+    start = date(year, 1, 1)
+    days = []
+    while value:
+        low = value & -value
+        days.append(start + timedelta(days=low.bit_length() - 1))
+        value ^= low
+    return days
+
+
+def completed_count(bitmap: bytes) -> int:
+    return bin(int.from_bytes(bitmap, "little")).count("1")
+
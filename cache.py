@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache settings
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "10000"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "300"))  # seconds
+
+
+class CacheBackend:
+    """Storage for cached results, grouped per user so writes can invalidate them.
+
+    The in-memory backend below is used by default; deployments running several
+    workers can plug in a shared implementation (e.g. Redis) with the same methods.
+    """
+
+    async def get(self, user_id: str, key: Hashable) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, user_id: str, key: Hashable, value: Any) -> None:
+        raise NotImplementedError
+
+    async def invalidate(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBackend(CacheBackend):
+    """Process-local LRU cache with a size bound and a per-entry TTL."""
+
+    def __init__(self, max_size: int = ANALYTICS_CACHE_SIZE, ttl: float = ANALYTICS_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._user_keys: Dict[str, Set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, user_id: str, key: Hashable) -> Optional[Any]:
+        item = self._entries.get((user_id, key))
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._remove((user_id, key))
+            return None
+        self._entries.move_to_end((user_id, key))
+        return value
+
+    async def set(self, user_id: str, key: Hashable, value: Any) -> None:
+        self._entries[(user_id, key)] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end((user_id, key))
+        self._user_keys.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate(self, user_id: str) -> None:
+        for key in self._user_keys.pop(user_id, ()):
+            self._entries.pop((user_id, key), None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._user_keys.clear()
+
+    def _remove(self, full_key: Tuple[str, Hashable]) -> None:
+        self._entries.pop(full_key, None)
+        user_id, key = full_key
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+
+class ResultCache:
+    """Per-user result cache with hit/miss accounting over a pluggable backend."""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend if backend is not None else InMemoryBackend()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: str, *key: Hashable) -> Optional[Any]:
+        try:
+            value = await self.backend.get(user_id, key)
+        except Exception as e:
+            logger.warning("Cache lookup failed: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, user_id: str, *key: Hashable, value: Any) -> None:
+        try:
+            await self.backend.set(user_id, key, value)
+        except Exception as e:
+            logger.warning("Cache store failed: %s", e)
+
+    async def invalidate(self, user_id: str) -> None:
+        try:
+            await self.backend.invalidate(user_id)
+        except Exception as e:
+            logger.error("Cache invalidation failed for user %s: %s", user_id, e)
+
+    async def clear(self) -> None:
+        try:
+            await self.backend.clear()
+        except Exception as e:
+            logger.error("Cache clear failed: %s", e)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Shared cache for /analytics results
+analytics_cache = ResultCache()
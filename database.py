@@ -1,36 +1,156 @@
 import os
-from supabase import create_client
+import asyncio
 import logging
 from dotenv import load_dotenv
+import time
+import httpx
+from typing import Optional
+from postgrest import AsyncPostgrestClient
+from gotrue import AsyncGoTrueClient
+from metrics import db_operation, record_db_call
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# Get Supabase credentials from environment variables
+# Supabase credentials; checked when the clients are first created, not at import
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # Service role key
-SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")  # Anon key
-
-logger.debug(f"SUPABASE_URL: {SUPABASE_URL}")
-logger.debug(f"SUPABASE_KEY: {SUPABASE_KEY[:10]}...")
-logger.debug(f"SUPABASE_ANON_KEY: {SUPABASE_ANON_KEY[:10]}...")
-
-if not SUPABASE_URL or not SUPABASE_KEY or not SUPABASE_ANON_KEY:
-    logger.error("Supabase credentials not found in environment variables")
-    raise ValueError("SUPABASE_URL, SUPABASE_KEY, and SUPABASE_ANON_KEY must be set in environment variables")
-
-try:
-    # Initialize Supabase clients
-    supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)  # Admin client
-    supabase_anon_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)  # Anonymous client
-    logger.info("Supabase clients initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Supabase clients: {str(e)}")
-    raise 
\ No newline at end of file
+
+# Connection pool settings for the async data client
+DB_HTTP2 = os.getenv("DB_HTTP2", "true").lower() == "true"
+DB_POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS", "100"))
+DB_POOL_MAX_KEEPALIVE = int(os.getenv("DB_POOL_MAX_KEEPALIVE", "20"))
+DB_KEEPALIVE_EXPIRY = float(os.getenv("DB_KEEPALIVE_EXPIRY", "30"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_REQUEST_TIMEOUT = float(os.getenv("DB_REQUEST_TIMEOUT", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Connections opened at startup so the first requests don't pay for the handshake
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", "4"))
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Times every Supabase round trip and attributes it to the current request."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            return await self._transport.handle_async_request(request)
+        finally:
+            record_db_call(db_operation(request.method, request.url.path), time.perf_counter() - started)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _build_http_client(base_url: str, headers: dict) -> httpx.AsyncClient:
+    """Create a pooled, keep-alive HTTP client shared by every request on this worker."""
+    transport = httpx.AsyncHTTPTransport(
+        http2=DB_HTTP2,
+        limits=httpx.Limits(
+            max_connections=DB_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=DB_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=DB_KEEPALIVE_EXPIRY,
+        ),
+    )
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers=headers,
+        transport=_InstrumentedTransport(transport),
+        timeout=httpx.Timeout(
+            DB_REQUEST_TIMEOUT,
+            connect=DB_CONNECT_TIMEOUT,
+            pool=DB_POOL_TIMEOUT,
+        ),
+    )
+
+
+class _PooledPostgrestClient(AsyncPostgrestClient):
+    """PostgREST client whose session uses our pool limits and HTTP/2."""
+
+    def create_session(self, base_url, headers, timeout) -> httpx.AsyncClient:
+        return _build_http_client(base_url, headers)
+
+
+class AsyncDatabase:
+    """Non-blocking access to the Supabase REST and auth APIs.
+
+    Mirrors the parts of the sync ``supabase`` client the routes use
+    (``from_``, ``rpc`` and ``auth``) but every ``execute()`` must be awaited.
+    The pooled clients are created on first use, so importing this module
+    is cheap; the app creates and warms them up in its lifespan.
+    """
+
+    def __init__(self, url: Optional[str], key: Optional[str]):
+        self.url = url
+        self.key = key
+        self._postgrest: Optional[_PooledPostgrestClient] = None
+        self._auth: Optional[AsyncGoTrueClient] = None
+
+    def _headers(self) -> dict:
+        if not self.url or not self.key:
+            raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+        return {"apikey": self.key, "Authorization": f"Bearer {self.key}"}
+
+    @property
+    def postgrest(self) -> _PooledPostgrestClient:
+        if self._postgrest is None:
+            headers = self._headers()
+            self._postgrest = _PooledPostgrestClient(f"{self.url}/rest/v1", headers={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+                **headers,
+            })
+        return self._postgrest
+
+    @property
+    def auth(self) -> AsyncGoTrueClient:
+        if self._auth is None:
+            headers = self._headers()
+            auth_url = f"{self.url}/auth/v1"
+            self._auth = AsyncGoTrueClient(
+                url=auth_url,
+                headers=headers,
+                http_client=_build_http_client(auth_url, headers),
+                auto_refresh_token=False,
+                persist_session=False,
+            )
+        return self._auth
+
+    def from_(self, table: str):
+        return self.postgrest.from_(table)
+
+    def table(self, table: str):
+        return self.from_(table)
+
+    def rpc(self, fn: str, params: dict):
+        return self.postgrest.rpc(fn, params)
+
+    async def ping(self) -> None:
+        """The cheapest query that proves PostgREST and the database answer."""
+        await self.from_('users').select("id").limit(1).execute()
+
+    async def connect(self, warm_connections: int = DB_WARM_CONNECTIONS) -> None:
+        """Create the data client and warm its pool with concurrent pings.
+
+        Raises if the credentials are missing or the database can't be reached.
+        """
+        warm_connections = max(1, warm_connections)
+        await asyncio.gather(*(self.ping() for _ in range(warm_connections)))
+        logger.info("Supabase client ready after %s warm-up ping(s)", warm_connections)
+
+    async def aclose(self) -> None:
+        if self._postgrest is not None:
+            await self._postgrest.aclose()
+            self._postgrest = None
+        if self._auth is not None:
+            await self._auth.close()
+            self._auth = None
+
+
+# Admin client, async and pooled
+db = AsyncDatabase(SUPABASE_URL, SUPABASE_KEY)
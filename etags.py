@@ -0,0 +1,148 @@
+import os
+import zlib
+import asyncio
+import logging
+from datetime import date
+from typing import Dict, Optional
+from fastapi import Depends, HTTPException, Request, Response
+from auth import get_current_user
+from cache import analytics_cache
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reads of the streak reset marker
+STREAK_RESET_POLL_INTERVAL = float(os.getenv("STREAK_RESET_POLL_INTERVAL", "30"))
+
+
+class VersionBackend:
+    """Per-user data version, bumped on every write.
+
+    The in-memory backend is only correct with a single worker; deployments
+    running several workers must plug in a shared implementation (e.g. a
+    Redis INCR) so a write on one worker invalidates ETags issued by another.
+    """
+
+    async def get(self, user_id: str) -> str:
+        """An opaque version string, embedded in the ETag as is."""
+        raise NotImplementedError
+
+    async def bump(self, user_id: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryVersionBackend(VersionBackend):
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        # Versions restart from zero with the process; the epoch keeps ETags
+        # issued before a restart from matching ones issued after it
+        self.epoch = os.urandom(4).hex()
+
+    async def get(self, user_id: str) -> str:
+        return f"{self.epoch}.{self._versions.get(user_id, 0)}"
+
+    async def bump(self, user_id: str) -> None:
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+
+class StreakResetMarker:
+    """When the nightly reconciliation last reset any streak, read every `interval` seconds.
+
+    The job runs as its own process and can't reach this worker's versions or
+    cache, so the marker is part of every user's version instead: once a read
+    sees it move, all ETags change and cached results are dropped.
+    """
+
+    def __init__(self, interval: float = STREAK_RESET_POLL_INTERVAL):
+        self.interval = interval
+        self.value = "0"
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh(self) -> None:
+        result = await db.from_('streak_resets').select('reset_at').limit(1).execute()
+        reset_at = result.data[0]['reset_at'] if result.data else ""
+        value = f"{zlib.crc32(reset_at.encode()):08x}"
+        if value != self.value:
+            # Versions move first, so a read already in flight doesn't cache
+            # its pre-reset result under the new version
+            self.value = value
+            await analytics_cache.clear()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Failed to read the streak reset marker: %s", e)
+            await asyncio.sleep(self.interval)
+
+
+streak_resets = StreakResetMarker()
+
+
+class UserVersions:
+    def __init__(self, backend: Optional[VersionBackend] = None):
+        self.backend = backend if backend is not None else InMemoryVersionBackend()
+
+    async def get(self, user_id: str) -> str:
+        return f"{await self.backend.get(user_id)}.{streak_resets.value}"
+
+    async def bump(self, user_id: str) -> None:
+        try:
+            await self.backend.bump(user_id)
+        except Exception as e:
+            logger.error("Failed to bump data version for user %s: %s", user_id, e)
+
+
+user_versions = UserVersions()
+
+
+async def invalidate_user(user_id: str) -> None:
+    """Call after any write to a user's data: drops cached results and stale ETags."""
+    await analytics_cache.invalidate(user_id)
+    await user_versions.bump(user_id)
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user)
+) -> str:
+    """Dependency for per-user reads: sets an ETag and answers If-None-Match with 304.
+
+    The tag combines the user's data version with the request path, query and
+    Accept header, so a 304 is decided without touching the database. The
+    date is included too, as date windows move on at midnight, and so is the
+    streak reset marker, which moves when the nightly reconciliation resets
+    streaks.
+    """
+    version = f"{await user_versions.get(user_id)}.{date.today():%Y%m%d}"
+    accept = request.headers.get("accept", "")
+    representation = zlib.crc32(f"{request.url.path}?{request.url.query}|{accept}".encode())
+    etag = f'W/"{version}.{representation:08x}"'
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        raise HTTPException(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return user_id
@@ -0,0 +1,143 @@
+import os
+import asyncio
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from postgrest.types import ReturnMethod
+from database import db
+from streaks import advance_streak, recompute_streak, streak_as_of, parse_day
+
+logger = logging.getLogger(__name__)
+
+# Bulk ingestion settings
+INGEST_INSERT_CHUNK_SIZE = int(os.getenv("INGEST_INSERT_CHUNK_SIZE", "500"))  # entries per insert
+INGEST_FILTER_CHUNK_SIZE = 100  # habit ids per `in` filter, keeps request URLs short
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _stored_streak(habit: Dict) -> Tuple[int, int, Optional[date]]:
+    return (habit.get('streak_count') or 0, habit.get('longest_streak') or 0, parse_day(habit.get('last_completed_date')))
+
+
+async def _owned_habits(user_id: str, habit_ids: List[str]) -> Dict[str, Dict]:
+    habits = {}
+    for ids in _chunks(habit_ids, INGEST_FILTER_CHUNK_SIZE):
+        result = await db.from_('habits')\
+            .select("id, streak_count, longest_streak, last_completed_date")\
+            .eq('user_id', user_id)\
+            .in_('id', ids)\
+            .execute()
+        habits.update({str(h['id']): h for h in result.data})
+    return habits
+
+
+async def _drop_recorded_days(wanted: Dict[str, Set[date]]) -> None:
+    """Remove days a habit already has entries for, using the one-row-per-day rollup."""
+    all_days = [day for days in wanted.values() for day in days]
+    if not all_days:
+        return
+    for ids in _chunks(list(wanted), INGEST_FILTER_CHUNK_SIZE):
+        result = await db.from_('habit_daily_stats')\
+            .select("habit_id, day")\
+            .in_('habit_id', ids)\
+            .gte('day', min(all_days).isoformat())\
+            .lte('day', max(all_days).isoformat())\
+            .execute()
+        for row in result.data:
+            wanted[str(row['habit_id'])].discard(parse_day(row['day']))
+
+
+async def _full_histories(user_id: str, habit_ids: List[str]) -> Dict[str, List[date]]:
+    histories: Dict[str, List[date]] = {habit_id: [] for habit_id in habit_ids}
+    for ids in _chunks(habit_ids, INGEST_FILTER_CHUNK_SIZE):
+        result = await db.rpc('habit_calendar_days', {
+            'p_user_id': user_id,
+            'p_habit_ids': ids,
+            'p_start': date.min.isoformat(),
+            'p_end': date.max.isoformat()
+        }).execute()
+        for row in result.data:
+            histories[str(row['habit_id'])] = [parse_day(d) for d in row['days'] or []]
+    return histories
+
+
+async def ingest_entries(user_id: str, entries: Iterable[Tuple[str, date]]) -> Dict:
+    """Record many `(habit_id, day)` check-ins for one user at once.
+
+    Entries for habits the user doesn't own are rejected; repeats within the
+    batch and days already recorded are skipped. New entries are written in
+    chunks of INGEST_INSERT_CHUNK_SIZE, then the streak of each habit in the
+    batch is updated once, if it changed: advanced in memory when every day
+    is after its last completion, otherwise recomputed from its full history.
+    Nothing here is one transaction, but retrying a failed batch converges.
+    """
+    received = 0
+    per_habit: Dict[str, int] = {}
+    wanted: Dict[str, Set[date]] = {}
+    for habit_id, day in entries:
+        received += 1
+        per_habit[habit_id] = per_habit.get(habit_id, 0) + 1
+        wanted.setdefault(habit_id, set()).add(day)
+
+    habits = await _owned_habits(user_id, list(wanted))
+    rejected = sum(count for habit_id, count in per_habit.items() if habit_id not in habits)
+    wanted = {habit_id: days for habit_id, days in wanted.items() if habit_id in habits}
+    # Streaks are computed from every day in the batch, not only the new ones,
+    # so retrying a batch whose streak update failed still repairs the streak
+    batch_days = {habit_id: set(days) for habit_id, days in wanted.items()}
+    await _drop_recorded_days(wanted)
+
+    rows = [
+        {"habit_id": habit_id, "user_id": user_id, "completed_at": day.isoformat()}
+        for habit_id, days in wanted.items()
+        for day in sorted(days)
+    ]
+    for chunk in _chunks(rows, INGEST_INSERT_CHUNK_SIZE):
+        await db.from_('habit_entries').insert(chunk, returning=ReturnMethod.minimal).execute()
+
+    streaks: Dict[str, Tuple[int, int, date]] = {}
+    needs_history = []
+    for habit_id, days in batch_days.items():
+        state = _stored_streak(habits[habit_id])
+        for day in sorted(days):
+            step = advance_streak(state[2], state[0], state[1], day)
+            if step is None:
+                needs_history.append(habit_id)
+                break
+            state = step
+        else:
+            streaks[habit_id] = streak_as_of(*state)
+
+    if needs_history:
+        logger.info("Recomputing streaks for %s habit(s) after bulk ingest", len(needs_history))
+        for habit_id, history in (await _full_histories(user_id, needs_history)).items():
+            current, longest, last = streak_as_of(*recompute_streak(history))
+            streaks[habit_id] = (current, max(longest, habits[habit_id].get('longest_streak') or 0), last)
+
+    await asyncio.gather(*(
+        db.from_('habits')
+            .update({
+                'streak_count': current,
+                'longest_streak': longest,
+                'last_completed_date': last.isoformat()
+            })
+            .eq('id', habit_id)
+            .execute()
+        for habit_id, (current, longest, last) in streaks.items()
+        if (current, longest, last) != _stored_streak(habits[habit_id])
+    ))
+
+    return {
+        "received": received,
+        "inserted": len(rows),
+        "duplicates": received - rejected - len(rows),
+        "rejected": rejected,
+        "habits": [
+            {"habit_id": habit_id, "streak_count": current, "longest_streak": longest}
+            for habit_id, (current, longest, _) in streaks.items()
+        ]
+    }
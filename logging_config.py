@@ -0,0 +1,130 @@
+import os
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+# Logging settings. APP_ENV picks the default level; LOG_LEVEL overrides it
+# and LOG_LEVELS sets per-logger levels, e.g. "httpx=WARNING,routes.habits=DEBUG"
+APP_ENV = os.getenv("APP_ENV", "development").lower()
+DEFAULT_LEVELS = {"development": "DEBUG", "staging": "INFO", "production": "INFO"}
+LOG_LEVEL = os.getenv("LOG_LEVEL", DEFAULT_LEVELS.get(APP_ENV, "INFO")).upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "" if APP_ENV == "development" else "httpx=WARNING,hpack=WARNING")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text" if APP_ENV == "development" else "json").lower()
+
+# Fraction of INFO and DEBUG records kept from the high-volume loggers;
+# warnings and errors are never sampled
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_SAMPLED_LOGGERS = os.getenv("LOG_SAMPLED_LOGGERS", "routes,httpx,uvicorn.access")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Loggers uvicorn sets up with their own stream handlers before importing the app
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+# uvicorn adds a terminal-coloured copy of its messages, not worth keeping.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "color_message"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only `rate` of the INFO/DEBUG records from the given logger prefixes."""
+
+    def __init__(self, rate: float, prefixes: Tuple[str, ...]):
+        super().__init__()
+        self.rate = rate
+        self.prefixes = prefixes
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        if not record.name.startswith(self.prefixes):
+            return True
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting them first.
+
+    The stock QueueHandler renders the message and traceback in the calling
+    thread; here that work, and the write itself, happen on the listener
+    thread so the event loop only pays for an enqueue. Log arguments are
+    therefore rendered later: pass values, not objects mutated afterwards.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging() -> None:
+    """Route all logging through a queue drained by a background thread. Idempotent."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    prefixes = tuple(p.strip() for p in LOG_SAMPLED_LOGGERS.split(",") if p.strip())
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE, prefixes))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    # Send the server's logs, the access log above all, through the queue as
+    # well. One left without handlers (--no-access-log) stays switched off.
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        if server_logger.handlers:
+            server_logger.handlers = []
+            server_logger.propagate = True
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
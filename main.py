@@ -1,15 +1,75 @@
+import time
+
+# Startup time is measured from the first line the worker runs
+_import_started = time.perf_counter()
+
+from logging_config import configure_logging
+
+# Set up logging before the other modules log anything at import time
+configure_logging()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth, habits, analytics
+from routes import auth, habits, analytics, calendar, dashboard, events
+from database import db
+from metrics import MetricsMiddleware, render_metrics, record_startup
+from singleflight import single_flight
+from admission import AdmissionMiddleware
+from purge import purge_worker, PURGE_ENABLED
+from reminders import reminder_scheduler, REMINDERS_ENABLED
+from etags import streak_resets
 import os
+import asyncio
+import logging
 from typing import List
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Seconds /ready waits for its database ping
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "2"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    try:
+        await db.connect()
+    except Exception as e:
+        # Serve anyway; /ready reports 503 until the database answers
+        logger.error("Database warm-up failed: %s", e)
+    streak_resets.start()
+    if PURGE_ENABLED:
+        purge_worker.start()
+    if REMINDERS_ENABLED:
+        reminder_scheduler.start()
+    app.state.accepting = True
+    
+    ready = time.perf_counter()
+    record_startup("import", started - _import_started)
+    record_startup("warmup", ready - started)
+    logger.info("Started in %.3fs (imports %.3fs, warm-up %.3fs)",
+                ready - _import_started, started - _import_started, ready - started)
+    yield
+    
+    app.state.accepting = False
+    await purge_worker.stop()
+    await reminder_scheduler.stop()
+    await streak_resets.stop()
+    await db.aclose()
+
+# Responses are encoded with orjson unless a route says otherwise
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+app.state.accepting = False
 
 def get_allowed_origins() -> List[str]:
     origins_str = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173")
     return [origin.strip() for origin in origins_str.split(",")]
 
+# Per-user rate limits and the in-flight cap; added first so it sits inside
+# CORS and its 429/503 responses still carry the CORS headers
+app.add_middleware(AdmissionMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -17,13 +77,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After"],
 )
 
+# Record per-route latency and Supabase round trips
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(habits.router)
 app.include_router(analytics.router)
+app.include_router(calendar.router)
+app.include_router(dashboard.router)
+app.include_router(events.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+    """Liveness: the process is up and serving."""
+    return {"status": "healthy"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: started, not shutting down, and the database answers a cheap query."""
+    if not app.state.accepting:
+        return ORJSONResponse({"status": "unavailable", "detail": "Not accepting traffic"}, status_code=503)
+    try:
+        # Concurrent probes share one ping
+        await asyncio.wait_for(single_flight.do("ready", db.ping), READY_TIMEOUT)
+    except Exception as e:
+        logger.warning("Readiness check failed: %s", e)
+        return ORJSONResponse({"status": "unavailable", "detail": "Database unreachable"}, status_code=503)
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,212 @@
+import os
+import time
+import random
+import logging
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from cache import analytics_cache
+from singleflight import single_flight
+from pubsub import user_events
+
+logger = logging.getLogger(__name__)
+
+# Slow-request sampling: requests slower than the threshold are logged with a
+# per-call breakdown, for the given fraction of them (0 disables it)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1.0"))
+
+# Seconds; the same buckets are used for request and database call latency
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            # one counter per bucket, then +Inf, sum
+            series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_str},le="{le}"}} {cumulative:g}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label_str}}} {cumulative:g}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+DB_CALL_LATENCY = Histogram(
+    "db_call_duration_seconds", "Supabase call latency by operation.",
+    ("operation",), LATENCY_BUCKETS,
+)
+DB_CALLS_PER_REQUEST = Histogram(
+    "db_calls_per_request", "Supabase round trips made while serving one request.",
+    ("method", "route"), COUNT_BUCKETS,
+)
+
+
+class RequestStats:
+    """Database calls made on behalf of the request currently being served."""
+
+    __slots__ = ("calls",)
+
+    def __init__(self):
+        self.calls: List[Tuple[str, float]] = []
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def db_operation(method: str, path: str) -> str:
+    """Low-cardinality label for a Supabase call, e.g. `GET habits` or `POST rpc/analytics_summary`."""
+    parts = [p for p in path.split("/") if p]
+    if len(parts) >= 2 and parts[0] in ("rest", "auth") and parts[1] == "v1":
+        service, parts = parts[0], parts[2:]
+    else:
+        service = ""
+    if parts and parts[0] in ("rpc", "admin"):
+        target = "/".join(parts[:2])
+    else:
+        target = parts[0] if parts else ""
+    if service == "auth":
+        target = f"auth/{target}"
+    return f"{method} {target}"
+
+
+def record_db_call(operation: str, duration: float) -> None:
+    DB_CALL_LATENCY.observe((operation,), duration)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.calls.append((operation, duration))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and Supabase round trips per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = 500
+        event_stream = False
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, event_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                event_stream = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            _current_request.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.observe((method, route_path, str(status)), duration)
+            DB_CALLS_PER_REQUEST.observe((method, route_path), len(stats.calls))
+            # Event streams stay open for as long as the client is connected
+            if (
+                not event_stream
+                and SLOW_REQUEST_SAMPLE_RATE > 0
+                and duration * 1000 >= SLOW_REQUEST_MS
+                and random.random() < SLOW_REQUEST_SAMPLE_RATE
+            ):
+                _log_slow_request(method, scope["path"], status, duration, stats)
+
+
+# Seconds each startup phase took in this worker
+_startup_seconds: Dict[str, float] = {}
+
+
+def record_startup(phase: str, seconds: float) -> None:
+    _startup_seconds[phase] = seconds
+
+
+def _log_slow_request(method: str, path: str, status: int, duration: float, stats: RequestStats) -> None:
+    db_time = sum(d for _, d in stats.calls)
+    breakdown = ", ".join(f"{op} {d * 1000:.1f}ms" for op, d in stats.calls)
+    logger.warning(
+        "Slow request %s %s -> %s in %.1fms: %s db calls, %.1fms in db [%s]",
+        method, path, status, duration * 1000, len(stats.calls), db_time * 1000, breakdown
+    )
+
+
+def render_metrics() -> str:
+    # Imported here: admission needs auth, which imports database, which imports this module
+    from admission import admission_stats
+
+    lines: List[str] = []
+    for histogram in (REQUEST_LATENCY, DB_CALLS_PER_REQUEST, DB_CALL_LATENCY):
+        lines.extend(histogram.render())
+    cache_stats = analytics_cache.stats()
+    lines.append("# HELP analytics_cache_requests_total Analytics cache lookups by result.")
+    lines.append("# TYPE analytics_cache_requests_total counter")
+    lines.append(f'analytics_cache_requests_total{{result="hit"}} {cache_stats["hits"]}')
+    lines.append(f'analytics_cache_requests_total{{result="miss"}} {cache_stats["misses"]}')
+    flight_stats = single_flight.stats()
+    lines.append("# HELP singleflight_reads_total Coalescible reads by whether they started a backend call or joined one.")
+    lines.append("# TYPE singleflight_reads_total counter")
+    lines.append(f'singleflight_reads_total{{result="started"}} {flight_stats["started"]}')
+    lines.append(f'singleflight_reads_total{{result="coalesced"}} {flight_stats["coalesced"]}')
+    lines.append("# HELP event_streams_open Server-Sent Event streams currently connected to this worker.")
+    lines.append("# TYPE event_streams_open gauge")
+    lines.append(f"event_streams_open {len(user_events.backend)}")
+    lines.append("# HELP events_published_total Per-user delta events published.")
+    lines.append("# TYPE events_published_total counter")
+    lines.append(f"events_published_total {user_events.published}")
+    lines.append("# HELP app_startup_seconds Time spent in each startup phase of this worker.")
+    lines.append("# TYPE app_startup_seconds gauge")
+    for phase, seconds in _startup_seconds.items():
+        lines.append(f'app_startup_seconds{{phase="{phase}"}} {seconds:.6f}')
+    lines.append("# HELP admission_requests_total Requests by admission decision and request class.")
+    lines.append("# TYPE admission_requests_total counter")
+    for kind, count in admission_stats.admitted.items():
+        lines.append(f'admission_requests_total{{result="admitted",class="{kind}"}} {count}')
+    for kind, count in admission_stats.limited.items():
+        lines.append(f'admission_requests_total{{result="rate_limited",class="{kind}"}} {count}')
+    lines.append("# HELP admission_shed_total Requests answered 503 because the in-flight cap was reached.")
+    lines.append("# TYPE admission_shed_total counter")
+    lines.append(f"admission_shed_total {admission_stats.shed}")
+    lines.append("# HELP requests_in_flight Admitted requests currently being served.")
+    lines.append("# TYPE requests_in_flight gauge")
+    lines.append(f"requests_in_flight {admission_stats.in_flight}")
+    return "\n".join(lines) + "\n"
@@ -2,11 +2,6 @@
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "pgcrypto";
 
--- Drop existing tables
-DROP TABLE IF EXISTS public.habits CASCADE;
-DROP TABLE IF EXISTS public.habit_entries CASCADE;
-DROP TABLE IF EXISTS public.users CASCADE;
-
 -- Create users table
 CREATE TABLE IF NOT EXISTS public.users (
     id UUID PRIMARY KEY,
@@ -28,7 +23,8 @@ CREATE TABLE IF NOT EXISTS public.habits (
     updated_at TIMESTAMPTZ DEFAULT NOW(),
     is_archived BOOLEAN DEFAULT FALSE,
     streak_count INTEGER DEFAULT 0,
-    longest_streak INTEGER DEFAULT 0
+    longest_streak INTEGER DEFAULT 0,
+    last_completed_date DATE
 );
 
 -- Create habit entries table
@@ -44,32 +40,38 @@ CREATE TABLE IF NOT EXISTS public.habit_entries (
 ALTER TABLE public.habits ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.habit_entries ENABLE ROW LEVEL SECURITY;
 
--- Create policies
+-- Create policies (dropped first so the migration can be re-applied safely)
+DROP POLICY IF EXISTS "Users can view their own habits" ON public.habits;
 CREATE POLICY "Users can view their own habits"
     ON public.habits
     FOR SELECT
     USING (user_id = auth.uid());
 
+DROP POLICY IF EXISTS "Users can create their own habits" ON public.habits;
 CREATE POLICY "Users can create their own habits"
     ON public.habits
     FOR INSERT
     WITH CHECK (user_id = auth.uid());
 
+DROP POLICY IF EXISTS "Users can update their own habits" ON public.habits;
 CREATE POLICY "Users can update their own habits"
     ON public.habits
     FOR UPDATE
     USING (user_id = auth.uid());
 
+DROP POLICY IF EXISTS "Users can delete their own habits" ON public.habits;
 CREATE POLICY "Users can delete their own habits"
     ON public.habits
     FOR DELETE
     USING (user_id = auth.uid());
 
+DROP POLICY IF EXISTS "Users can view their own habit entries" ON public.habit_entries;
 CREATE POLICY "Users can view their own habit entries"
     ON public.habit_entries
     FOR SELECT
     USING (user_id = auth.uid());
 
+DROP POLICY IF EXISTS "Users can create their own habit entries" ON public.habit_entries;
 CREATE POLICY "Users can create their own habit entries"
     ON public.habit_entries
     FOR INSERT
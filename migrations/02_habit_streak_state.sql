@@ -0,0 +1,14 @@
+-- Track the last completion day on each habit so streaks can be advanced
+-- incrementally instead of rescanning every entry on check-in.
+ALTER TABLE public.habits ADD COLUMN IF NOT EXISTS last_completed_date DATE;
+
+-- Backfill from existing entries
+UPDATE public.habits h
+SET last_completed_date = e.last_day
+FROM (
+    SELECT habit_id, MAX(completed_at)::date AS last_day
+    FROM public.habit_entries
+    GROUP BY habit_id
+) e
+WHERE e.habit_id = h.id
+  AND h.last_completed_date IS NULL;
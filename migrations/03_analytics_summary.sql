@@ -0,0 +1,19 @@
+-- Aggregate the analytics summary in the database so the API never has to
+-- download a user's habits and entries just to count them.
+CREATE OR REPLACE FUNCTION public.analytics_summary(p_user_id UUID)
+RETURNS TABLE (
+    total_habits BIGINT,
+    active_habits BIGINT,
+    total_entries BIGINT,
+    current_streak INTEGER,
+    longest_streak INTEGER
+) AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE NOT COALESCE(h.is_archived, FALSE)),
+        (SELECT COUNT(*) FROM public.habit_entries e WHERE e.user_id = p_user_id),
+        COALESCE(MAX(h.streak_count), 0),
+        COALESCE(MAX(h.longest_streak), 0)
+    FROM public.habits h
+    WHERE h.user_id = p_user_id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
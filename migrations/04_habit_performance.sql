@@ -0,0 +1,32 @@
+-- Per-habit completion counts over a date window, grouped in the database
+-- so the API does one pass over the user's habits regardless of window size.
+CREATE OR REPLACE FUNCTION public.habit_performance(
+    p_user_id UUID,
+    p_start DATE,
+    p_end DATE,
+    p_category TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    category TEXT,
+    streak_count INTEGER,
+    longest_streak INTEGER,
+    completions BIGINT
+) AS $$
+    SELECT
+        h.id,
+        h.name,
+        h.category,
+        COALESCE(h.streak_count, 0),
+        COALESCE(h.longest_streak, 0),
+        COUNT(e.id)
+    FROM public.habits h
+    LEFT JOIN public.habit_entries e
+        ON e.habit_id = h.id
+       AND e.completed_at >= p_start
+       AND e.completed_at <= p_end
+    WHERE h.user_id = p_user_id
+      AND (p_category IS NULL OR h.category = p_category)
+    GROUP BY h.id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
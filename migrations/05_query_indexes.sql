@@ -0,0 +1,23 @@
+-- Composite indexes matching the filters and orderings used in routes/.
+-- Plain CREATE INDEX (not CONCURRENTLY) because exec_sql runs inside a
+-- transaction; on very large tables build these by hand first.
+
+-- Entries for one habit in date order: listing, streak recompute, delete
+CREATE INDEX IF NOT EXISTS idx_habit_entries_habit_completed
+    ON public.habit_entries (habit_id, completed_at, id);
+
+-- Entries for one user over a date window: analytics
+CREATE INDEX IF NOT EXISTS idx_habit_entries_user_completed
+    ON public.habit_entries (user_id, completed_at);
+
+-- Active habits for a user
+CREATE INDEX IF NOT EXISTS idx_habits_user_archived
+    ON public.habits (user_id, is_archived);
+
+-- Habit listing in keyset order
+CREATE INDEX IF NOT EXISTS idx_habits_user_created
+    ON public.habits (user_id, created_at, id);
+
+-- Username availability check at signup
+CREATE INDEX IF NOT EXISTS idx_users_username
+    ON public.users (username);
@@ -0,0 +1,13 @@
+-- Return the plan for a query so run_migrations.py can confirm the hot
+-- queries use their indexes. Sequential scans are disabled for the call so
+-- the check is meaningful on small tables, where the planner would
+-- otherwise prefer them.
+CREATE OR REPLACE FUNCTION public.explain_plan(query TEXT)
+RETURNS SETOF TEXT AS $$
+BEGIN
+  SET LOCAL enable_seqscan = off;
+  RETURN QUERY EXECUTE 'EXPLAIN ' || query;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.explain_plan(TEXT) FROM PUBLIC, anon, authenticated;
@@ -0,0 +1,136 @@
+-- Per-habit, per-day completion counts maintained from habit_entries by
+-- trigger, so analytics read one compact row per day instead of raw entries.
+CREATE TABLE IF NOT EXISTS public.habit_daily_stats (
+    habit_id UUID NOT NULL REFERENCES public.habits(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    user_id UUID NOT NULL REFERENCES public.users(id),
+    completions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (habit_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_habit_daily_stats_user_day
+    ON public.habit_daily_stats (user_id, day);
+
+ALTER TABLE public.habit_daily_stats ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view their own daily stats" ON public.habit_daily_stats;
+CREATE POLICY "Users can view their own daily stats"
+    ON public.habit_daily_stats
+    FOR SELECT
+    USING (user_id = auth.uid());
+
+GRANT SELECT ON public.habit_daily_stats TO authenticated;
+
+-- Keep the rollup in step with every insert and delete on habit_entries
+CREATE OR REPLACE FUNCTION public.habit_daily_stats_apply()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO public.habit_daily_stats (habit_id, day, user_id, completions)
+    VALUES (NEW.habit_id, (NEW.completed_at AT TIME ZONE 'UTC')::date, NEW.user_id, 1)
+    ON CONFLICT (habit_id, day)
+    DO UPDATE SET completions = public.habit_daily_stats.completions + 1;
+    RETURN NEW;
+  END IF;
+
+  UPDATE public.habit_daily_stats
+  SET completions = completions - 1
+  WHERE habit_id = OLD.habit_id
+    AND day = (OLD.completed_at AT TIME ZONE 'UTC')::date;
+
+  DELETE FROM public.habit_daily_stats
+  WHERE habit_id = OLD.habit_id
+    AND day = (OLD.completed_at AT TIME ZONE 'UTC')::date
+    AND completions <= 0;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS habit_entries_daily_stats ON public.habit_entries;
+CREATE TRIGGER habit_entries_daily_stats
+    AFTER INSERT OR DELETE ON public.habit_entries
+    FOR EACH ROW EXECUTE FUNCTION public.habit_daily_stats_apply();
+
+-- Rebuild the rollup for the next batch of habits after p_after (keyset on
+-- habits.id). Returns the last habit id processed, or NULL when done.
+CREATE OR REPLACE FUNCTION public.backfill_habit_daily_stats(p_after UUID, p_batch_size INTEGER)
+RETURNS UUID AS $$
+DECLARE
+  v_ids UUID[];
+BEGIN
+  SELECT array_agg(id ORDER BY id) INTO v_ids
+  FROM (
+    SELECT id FROM public.habits
+    WHERE p_after IS NULL OR id > p_after
+    ORDER BY id
+    LIMIT p_batch_size
+  ) batch;
+
+  IF v_ids IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  DELETE FROM public.habit_daily_stats WHERE habit_id = ANY(v_ids);
+
+  INSERT INTO public.habit_daily_stats (habit_id, day, user_id, completions)
+  SELECT habit_id, (completed_at AT TIME ZONE 'UTC')::date, user_id, COUNT(*)
+  FROM public.habit_entries
+  WHERE habit_id = ANY(v_ids)
+  GROUP BY habit_id, (completed_at AT TIME ZONE 'UTC')::date, user_id;
+
+  RETURN v_ids[array_length(v_ids, 1)];
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.backfill_habit_daily_stats(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- Analytics now read from the rollup
+CREATE OR REPLACE FUNCTION public.analytics_summary(p_user_id UUID)
+RETURNS TABLE (
+    total_habits BIGINT,
+    active_habits BIGINT,
+    total_entries BIGINT,
+    current_streak INTEGER,
+    longest_streak INTEGER
+) AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE NOT COALESCE(h.is_archived, FALSE)),
+        (SELECT COALESCE(SUM(s.completions), 0)::BIGINT
+         FROM public.habit_daily_stats s WHERE s.user_id = p_user_id),
+        COALESCE(MAX(h.streak_count), 0),
+        COALESCE(MAX(h.longest_streak), 0)
+    FROM public.habits h
+    WHERE h.user_id = p_user_id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION public.habit_performance(
+    p_user_id UUID,
+    p_start DATE,
+    p_end DATE,
+    p_category TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    category TEXT,
+    streak_count INTEGER,
+    longest_streak INTEGER,
+    completions BIGINT
+) AS $$
+    SELECT
+        h.id,
+        h.name,
+        h.category,
+        COALESCE(h.streak_count, 0),
+        COALESCE(h.longest_streak, 0),
+        COALESCE(SUM(s.completions), 0)::BIGINT
+    FROM public.habits h
+    LEFT JOIN public.habit_daily_stats s
+        ON s.habit_id = h.id
+       AND s.day >= p_start
+       AND s.day <= p_end
+    WHERE h.user_id = p_user_id
+      AND (p_category IS NULL OR h.category = p_category)
+    GROUP BY h.id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
@@ -0,0 +1,20 @@
+-- Completed days per habit for a date range, one row per habit, read from
+-- the daily rollup. Backs the bitmap calendar endpoints.
+CREATE OR REPLACE FUNCTION public.habit_calendar_days(
+    p_user_id UUID,
+    p_habit_ids UUID[],
+    p_start DATE,
+    p_end DATE
+)
+RETURNS TABLE (
+    habit_id UUID,
+    days DATE[]
+) AS $$
+    SELECT s.habit_id, array_agg(s.day ORDER BY s.day)
+    FROM public.habit_daily_stats s
+    WHERE s.user_id = p_user_id
+      AND s.habit_id = ANY(p_habit_ids)
+      AND s.day >= p_start
+      AND s.day <= p_end
+    GROUP BY s.habit_id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
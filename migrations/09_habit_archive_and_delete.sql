@@ -0,0 +1,62 @@
+-- Deleting a habit removes its entries in the same statement
+ALTER TABLE public.habit_entries
+    DROP CONSTRAINT IF EXISTS habit_entries_habit_id_fkey;
+ALTER TABLE public.habit_entries
+    ADD CONSTRAINT habit_entries_habit_id_fkey
+    FOREIGN KEY (habit_id) REFERENCES public.habits(id) ON DELETE CASCADE;
+
+-- When a habit was archived; its entries are purged once this is older
+-- than the purge grace period
+ALTER TABLE public.habits ADD COLUMN IF NOT EXISTS archived_at TIMESTAMPTZ;
+
+UPDATE public.habits
+SET archived_at = COALESCE(updated_at, NOW())
+WHERE is_archived AND archived_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_habits_archived_at
+    ON public.habits (archived_at)
+    WHERE is_archived;
+
+-- Ownership-checked hard delete in one round trip. Entries and rollup rows
+-- go with the habit via ON DELETE CASCADE. Returns whether a habit was deleted.
+CREATE OR REPLACE FUNCTION public.delete_habit(p_habit_id UUID, p_user_id UUID)
+RETURNS BOOLEAN AS $$
+    WITH deleted AS (
+        DELETE FROM public.habits
+        WHERE id = p_habit_id
+          AND user_id = p_user_id
+        RETURNING id
+    )
+    SELECT EXISTS (SELECT 1 FROM deleted);
+$$ LANGUAGE sql SECURITY DEFINER;
+
+-- Delete up to p_batch_size entries of habits archived before
+-- p_archived_before. Locked rows are skipped so several workers can run at
+-- once. Returns the number of entries removed per user.
+CREATE OR REPLACE FUNCTION public.purge_archived_entries(
+    p_archived_before TIMESTAMPTZ,
+    p_batch_size INTEGER
+)
+RETURNS TABLE (
+    user_id UUID,
+    purged INTEGER
+) AS $$
+    WITH batch AS (
+        SELECT e.id
+        FROM public.habit_entries e
+        JOIN public.habits h ON h.id = e.habit_id
+        WHERE h.is_archived
+          AND h.archived_at < p_archived_before
+        LIMIT p_batch_size
+        FOR UPDATE OF e SKIP LOCKED
+    ),
+    deleted AS (
+        DELETE FROM public.habit_entries e
+        USING batch
+        WHERE e.id = batch.id
+        RETURNING e.user_id
+    )
+    SELECT deleted.user_id, COUNT(*)::INTEGER
+    FROM deleted
+    GROUP BY deleted.user_id;
+$$ LANGUAGE sql SECURITY DEFINER;
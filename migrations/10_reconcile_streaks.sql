@@ -0,0 +1,39 @@
+-- Reset the current streak of active habits whose last completion is older
+-- than yesterday, for the next p_batch_size habits after p_after (keyset on
+-- habits.id, bounded above by p_before when set). Returns the last habit id
+-- scanned (NULL when the range is exhausted), how many were scanned and how
+-- many were reset. longest_streak and last_completed_date are kept.
+CREATE OR REPLACE FUNCTION public.reconcile_streaks(
+    p_after UUID,
+    p_before UUID,
+    p_batch_size INTEGER,
+    p_today DATE
+)
+RETURNS TABLE (
+    last_id UUID,
+    scanned INTEGER,
+    reset_count INTEGER
+) AS $$
+    WITH batch AS (
+        SELECT id, streak_count, last_completed_date
+        FROM public.habits
+        WHERE NOT is_archived
+          AND (p_after IS NULL OR id > p_after)
+          AND (p_before IS NULL OR id < p_before)
+        ORDER BY id
+        LIMIT p_batch_size
+    ),
+    cleared AS (
+        UPDATE public.habits h
+        SET streak_count = 0
+        FROM batch
+        WHERE h.id = batch.id
+          AND batch.streak_count > 0
+          AND batch.last_completed_date < p_today - 1
+        RETURNING h.id
+    )
+    SELECT
+        (SELECT id FROM batch ORDER BY id DESC LIMIT 1),
+        (SELECT COUNT(*)::INTEGER FROM batch),
+        (SELECT COUNT(*)::INTEGER FROM cleared);
+$$ LANGUAGE sql SECURITY DEFINER;
@@ -0,0 +1,7 @@
+-- Optional daily reminder time (UTC) per habit
+ALTER TABLE public.habits ADD COLUMN IF NOT EXISTS reminder_time TIME;
+
+-- Active habits with a reminder, in the keyset order the reminder scheduler loads them
+CREATE INDEX IF NOT EXISTS idx_habits_reminders
+    ON public.habits (created_at, id)
+    WHERE reminder_time IS NOT NULL AND NOT is_archived;
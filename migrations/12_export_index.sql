@@ -0,0 +1,3 @@
+-- Entries for one user in insertion order: full and incremental (`since`) exports
+CREATE INDEX IF NOT EXISTS idx_habit_entries_user_created
+    ON public.habit_entries (user_id, created_at, id);
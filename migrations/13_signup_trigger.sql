@@ -0,0 +1,28 @@
+-- Usernames are unique; the signup trigger below relies on this instead of
+-- a separate lookup. Resolve any existing duplicates before applying.
+DROP INDEX IF EXISTS public.idx_users_username;
+CREATE UNIQUE INDEX IF NOT EXISTS users_username_key
+    ON public.users (username);
+
+-- Create the public.users row in the same transaction as the auth user, so
+-- signup is a single call to the auth API. A taken username makes the whole
+-- signup fail, and no auth user is left behind to clean up.
+CREATE OR REPLACE FUNCTION public.handle_new_auth_user()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO public.users (id, username, email, created_at, updated_at)
+    VALUES (
+        NEW.id,
+        COALESCE(NULLIF(TRIM(NEW.raw_user_meta_data->>'username'), ''), split_part(NEW.email, '@', 1)),
+        LOWER(NEW.email),
+        NOW(),
+        NOW()
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS on_auth_user_created ON auth.users;
+CREATE TRIGGER on_auth_user_created
+    AFTER INSERT ON auth.users
+    FOR EACH ROW EXECUTE FUNCTION public.handle_new_auth_user();
@@ -0,0 +1,41 @@
+-- reconcile_streaks also returns the owners of the habits it reset, so the
+-- caller can invalidate their cached results and ETags. The return type
+-- changes, so the function is dropped and recreated.
+DROP FUNCTION IF EXISTS public.reconcile_streaks(UUID, UUID, INTEGER, DATE);
+
+CREATE OR REPLACE FUNCTION public.reconcile_streaks(
+    p_after UUID,
+    p_before UUID,
+    p_batch_size INTEGER,
+    p_today DATE
+)
+RETURNS TABLE (
+    last_id UUID,
+    scanned INTEGER,
+    reset_count INTEGER,
+    reset_user_ids UUID[]
+) AS $$
+    WITH batch AS (
+        SELECT id, streak_count, last_completed_date
+        FROM public.habits
+        WHERE NOT is_archived
+          AND (p_after IS NULL OR id > p_after)
+          AND (p_before IS NULL OR id < p_before)
+        ORDER BY id
+        LIMIT p_batch_size
+    ),
+    cleared AS (
+        UPDATE public.habits h
+        SET streak_count = 0
+        FROM batch
+        WHERE h.id = batch.id
+          AND batch.streak_count > 0
+          AND batch.last_completed_date < p_today - 1
+        RETURNING h.id, h.user_id
+    )
+    SELECT
+        (SELECT id FROM batch ORDER BY id DESC LIMIT 1),
+        (SELECT COUNT(*)::INTEGER FROM batch),
+        (SELECT COUNT(*)::INTEGER FROM cleared),
+        (SELECT COALESCE(array_agg(DISTINCT user_id), '{}') FROM cleared);
+$$ LANGUAGE sql SECURITY DEFINER;
@@ -0,0 +1,15 @@
+-- Every change to a habit row moves updated_at, whichever path made it:
+-- PATCH, archive, check-ins, bulk ingest or the nightly streak reset.
+-- Incremental exports select habits by updated_at.
+CREATE OR REPLACE FUNCTION public.set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS habits_set_updated_at ON public.habits;
+CREATE TRIGGER habits_set_updated_at
+    BEFORE UPDATE ON public.habits
+    FOR EACH ROW EXECUTE FUNCTION public.set_updated_at();
@@ -0,0 +1,4 @@
+-- Habits changed since a point in time, in the keyset order the reminder
+-- scheduler's incremental sync reads them
+CREATE INDEX IF NOT EXISTS idx_habits_updated
+    ON public.habits (updated_at, id);
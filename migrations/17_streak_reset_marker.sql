@@ -0,0 +1,57 @@
+-- When reconcile_streaks last reset any streak. The job runs outside the app,
+-- so the app's workers poll this single row and fold it into every ETag and
+-- cache lookup instead of relying on the job to invalidate them.
+CREATE TABLE IF NOT EXISTS public.streak_resets (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    reset_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO public.streak_resets (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+-- Only the service role reads and writes it
+ALTER TABLE public.streak_resets ENABLE ROW LEVEL SECURITY;
+
+-- Same signature and result as before; a chunk that resets anything also
+-- moves the marker, in the same statement
+CREATE OR REPLACE FUNCTION public.reconcile_streaks(
+    p_after UUID,
+    p_before UUID,
+    p_batch_size INTEGER,
+    p_today DATE
+)
+RETURNS TABLE (
+    last_id UUID,
+    scanned INTEGER,
+    reset_count INTEGER,
+    reset_user_ids UUID[]
+) AS $$
+    WITH batch AS (
+        SELECT id, streak_count, last_completed_date
+        FROM public.habits
+        WHERE NOT is_archived
+          AND (p_after IS NULL OR id > p_after)
+          AND (p_before IS NULL OR id < p_before)
+        ORDER BY id
+        LIMIT p_batch_size
+    ),
+    cleared AS (
+        UPDATE public.habits h
+        SET streak_count = 0
+        FROM batch
+        WHERE h.id = batch.id
+          AND batch.streak_count > 0
+          AND batch.last_completed_date < p_today - 1
+        RETURNING h.id, h.user_id
+    ),
+    marked AS (
+        INSERT INTO public.streak_resets (id, reset_at)
+        SELECT TRUE, NOW()
+        WHERE EXISTS (SELECT 1 FROM cleared)
+        ON CONFLICT (id) DO UPDATE SET reset_at = EXCLUDED.reset_at
+    )
+    SELECT
+        (SELECT id FROM batch ORDER BY id DESC LIMIT 1),
+        (SELECT COUNT(*)::INTEGER FROM batch),
+        (SELECT COUNT(*)::INTEGER FROM cleared),
+        (SELECT COALESCE(array_agg(DISTINCT user_id), '{}') FROM cleared);
+$$ LANGUAGE sql SECURITY DEFINER;
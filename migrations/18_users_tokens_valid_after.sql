@@ -0,0 +1,4 @@
+-- Refresh tokens issued for sessions that started before this time are
+-- rejected; logout moves it forward. NULL means nothing was revoked.
+ALTER TABLE public.users
+    ADD COLUMN IF NOT EXISTS tokens_valid_after TIMESTAMPTZ;
@@ -31,8 +31,10 @@ class Habit(BaseModel):
     color: str
     reminder_time: Optional[time] = None
     is_archived: bool
+    archived_at: Optional[datetime] = None
     streak_count: int
     longest_streak: int
+    last_completed_date: Optional[date] = None
     created_at: datetime
     updated_at: datetime
 
@@ -44,11 +46,44 @@ class HabitEntry(BaseModel):
     id: UUID
     habit_id: UUID
     user_id: UUID
-    date: date
-    notes: Optional[str] = None
     completed_at: datetime
     created_at: datetime
 
+class HabitEntryCreated(HabitEntry):
+    # the habit's streak after this entry
+    streak_count: int
+    longest_streak: int
+
+class HabitStreak(BaseModel):
+    habit_id: UUID
+    streak_count: int
+    longest_streak: int
+
+class EntryBatchResult(BaseModel):
+    received: int
+    inserted: int
+    # repeated in the batch or already recorded
+    duplicates: int
+    # unknown habit, or an unreadable CSV row
+    rejected: int
+    habits: List[HabitStreak]
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # seconds until access_token expires
+
+class Message(BaseModel):
+    message: str
+
+class AnalyticsOverview(BaseModel):
+    total_habits: int
+    total_entries: int
+    active_habits: int
+    current_streak: int
+    longest_streak: int
+
 class AnalyticsSummary(BaseModel):
     current_streak: int
     longest_streak: int
@@ -57,4 +92,15 @@ class AnalyticsSummary(BaseModel):
 
 class HabitAnalytics(BaseModel):
     streak_data: AnalyticsSummary
-    completion_history: List[date] 
\ No newline at end of file
+    completion_history: List[date] 
+
+class HabitCalendar(BaseModel):
+    habit_id: UUID
+    year: int
+    days: int
+    completed_days: int
+    encoding: str
+    # base64 of the packed per-day bitmap (bit i = day i of the year)
+    bitmap: Optional[str] = None
+    # alternating run lengths, starting with a run of missed days
+    runs: Optional[List[int]] = None
@@ -0,0 +1,111 @@
+import base64
+import csv
+import io
+import json
+import logging
+import orjson
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_CHUNK_SIZE = 500
+CSV_BUFFER_SIZE = 64 * 1024
+
+
+def encode_cursor(row: Dict, column: str) -> str:
+    """Opaque cursor pointing just past `row` in `(column, id)` order."""
+    raw = json.dumps([row[column], row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """The `(timestamp, id)` position in a cursor, checked before it's spliced into a filter."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        datetime.fromisoformat(value)
+        return value, str(UUID(row_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset(query, column: str, after: Optional[Tuple[str, str]], limit: int):
+    """Order `query` by `(column, id)` and start it after the given position."""
+    query.params = query.params.add("order", f"{column}.asc,id.asc")
+    if after:
+        value, row_id = after
+        query.params = query.params.add(
+            "or", f'({column}.gt."{value}",and({column}.eq."{value}",id.gt.{row_id}))'
+        )
+    return query.limit(limit)
+
+
+async def fetch_page(
+    build_query: Callable, column: str, cursor: Optional[str], limit: int
+) -> Tuple[List[Dict], Optional[str]]:
+    """Fetch one page of rows plus the cursor for the next page, if any."""
+    after = decode_cursor(cursor) if cursor else None
+    result = await keyset(build_query(), column, after, limit + 1).execute()
+    rows = result.data
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1], column)
+    return rows, None
+
+
+async def stream_rows(
+    build_query: Callable,
+    column: str,
+    cursor: Optional[str] = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> AsyncIterator[Dict]:
+    """Yield every matching row, reading the database `chunk_size` rows at a time."""
+    after = decode_cursor(cursor) if cursor else None
+    while True:
+        result = await keyset(build_query(), column, after, chunk_size).execute()
+        for row in result.data:
+            yield row
+        if len(result.data) < chunk_size:
+            return
+        last = result.data[-1]
+        after = (str(last[column]), str(last['id']))
+
+
+async def ndjson(rows: AsyncIterator[Dict]) -> AsyncIterator[bytes]:
+    try:
+        async for row in rows:
+            yield orjson.dumps(row, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    except Exception as e:
+        # Headers are already sent; aborting the connection tells the client
+        # the stream is incomplete
+        logger.error("NDJSON stream aborted: %s", e)
+        raise
+
+
+async def csv_lines(
+    rows: AsyncIterator[Dict], columns: List[str], buffer_size: int = CSV_BUFFER_SIZE
+) -> AsyncIterator[bytes]:
+    """Encode rows as CSV under a header line, yielding about `buffer_size` bytes at a time."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    try:
+        async for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= buffer_size:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+    except Exception as e:
+        logger.error("CSV stream aborted: %s", e)
+        raise
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
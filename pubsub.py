@@ -0,0 +1,112 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Push channel settings
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))  # pending events per connection
+MAX_STREAMS_PER_USER = int(os.getenv("MAX_STREAMS_PER_USER", "10"))
+
+
+class Subscription:
+    """One connected client's queue of pending events.
+
+    A client that falls EVENT_QUEUE_SIZE events behind stops receiving
+    deltas and is told to resync, instead of the queue growing unbounded.
+    """
+
+    __slots__ = ("user_id", "queue", "overflowed")
+
+    def __init__(self, user_id: str, size: int = EVENT_QUEUE_SIZE):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """The next event, a resync marker after an overflow, or None on timeout."""
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return {"type": "resync", "data": {}}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class PubSubBackend:
+    """Fan-out of per-user events to connected clients.
+
+    The in-memory backend below only reaches clients connected to the same
+    worker; deployments running several workers can plug in a shared one
+    (e.g. Redis pub/sub or Postgres LISTEN/NOTIFY) that relays each
+    published event to every worker's local subscriptions.
+    """
+
+    def __len__(self) -> int:
+        """Subscriptions held by this worker."""
+        raise NotImplementedError
+
+    async def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, user_id: str) -> Subscription:
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        raise NotImplementedError
+
+
+class InMemoryPubSub(PubSubBackend):
+    def __init__(self, max_per_user: int = MAX_STREAMS_PER_USER):
+        self.max_per_user = max_per_user
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    async def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+        for subscription in self._subscriptions.get(user_id, ()):
+            subscription.deliver(event)
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscriptions = self._subscriptions.setdefault(user_id, set())
+        if len(subscriptions) >= self.max_per_user:
+            raise OverflowError(f"Too many open event streams for user {user_id}")
+        subscription = Subscription(user_id)
+        subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+
+class UserEvents:
+    """Publishes small per-user deltas; failures never fail the write that caused them."""
+
+    def __init__(self, backend: Optional[PubSubBackend] = None):
+        self.backend = backend if backend is not None else InMemoryPubSub()
+        self.published = 0
+
+    async def publish(self, user_id: str, event_type: str, data: Dict[str, Any]) -> None:
+        try:
+            await self.backend.publish(user_id, {"type": event_type, "data": data})
+            self.published += 1
+        except Exception as e:
+            logger.error("Failed to publish %s event for user %s: %s", event_type, user_id, e)
+
+
+user_events = UserEvents()
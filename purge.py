@@ -0,0 +1,78 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from database import db
+from etags import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+# Purge settings
+PURGE_ENABLED = os.getenv("PURGE_ENABLED", "true").lower() == "true"
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", "300"))  # seconds between passes
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))  # entries per round trip
+PURGE_BATCH_PAUSE = float(os.getenv("PURGE_BATCH_PAUSE", "0.5"))  # seconds between batches
+PURGE_GRACE_DAYS = float(os.getenv("PURGE_GRACE_DAYS", "30"))  # archived habits can be restored until then
+
+
+async def purge_archived_entries(
+    batch_size: int = PURGE_BATCH_SIZE,
+    grace_days: float = PURGE_GRACE_DAYS,
+    pause: float = PURGE_BATCH_PAUSE
+) -> int:
+    """Delete entries of habits archived more than `grace_days` ago.
+
+    Works in batches of `batch_size` entries, each its own short transaction,
+    pausing between them so a large backlog never holds locks for long.
+    Returns the number of entries removed.
+    """
+    archived_before = (datetime.now(timezone.utc) - timedelta(days=grace_days)).isoformat()
+    total = 0
+    while True:
+        result = await db.rpc('purge_archived_entries', {
+            'p_archived_before': archived_before,
+            'p_batch_size': batch_size
+        }).execute()
+        purged = 0
+        for row in result.data or []:
+            purged += row['purged']
+            await invalidate_user(row['user_id'])
+        total += purged
+        if purged < batch_size:
+            return total
+        await asyncio.sleep(pause)
+
+
+class PurgeWorker:
+    """Runs `purge_archived_entries` every `interval` seconds in the background."""
+
+    def __init__(self, interval: float = PURGE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                purged = await purge_archived_entries()
+                if purged:
+                    logger.info("Purged %s entries of archived habits", purged)
+            except Exception as e:
+                logger.error("Purge of archived habits failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+
+purge_worker = PurgeWorker()
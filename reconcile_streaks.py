@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from database import db
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def partition_bounds(partitions: int) -> List[Dict[str, Optional[str]]]:
+    """Split the habit id space into `partitions` contiguous keyset ranges.
+
+    Habit ids are random v4 UUIDs, so equal slices of the 128-bit space hold
+    roughly equal numbers of habits.
+    """
+    step = (1 << 128) // partitions
+    # Both bounds are exclusive: slice i covers [i * step, (i + 1) * step)
+    lowers = [None] + [str(uuid.UUID(int=i * step - 1)) for i in range(1, partitions)]
+    uppers = [str(uuid.UUID(int=i * step)) for i in range(1, partitions)] + [None]
+    return [
+        {"after": lower, "before": upper, "done": False}
+        for lower, upper in zip(lowers, uppers)
+    ]
+
+
+class Checkpoint:
+    """Progress per partition, written after every chunk so a crashed run resumes."""
+
+    def __init__(self, path: Optional[str], today: str, partitions: int):
+        self.path = path
+        self.state = {"today": today, "partitions": partition_bounds(partitions)}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("today") == today and len(saved.get("partitions", [])) == partitions:
+                self.state = saved
+                logger.info(f"Resuming reconciliation for {today} from {path}")
+
+    @property
+    def partitions(self) -> List[Dict]:
+        return self.state["partitions"]
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def _reconcile_partition(partition: Dict, today: str, batch_size: int, checkpoint: Checkpoint, totals: Dict) -> None:
+    while not partition["done"]:
+        response = await db.rpc('reconcile_streaks', {
+            'p_after': partition["after"],
+            'p_before': partition["before"],
+            'p_batch_size': batch_size,
+            'p_today': today
+        }).execute()
+        row = response.data[0] if response.data else {}
+        totals["scanned"] += row.get('scanned') or 0
+        totals["reset"] += row.get('reset_count') or 0
+        # A chunk that resets streaks also moves the streak_resets marker,
+        # which the app's workers fold into their ETags and cache lookups
+        if row.get('last_id') is None or (row.get('scanned') or 0) < batch_size:
+            partition["done"] = True
+        else:
+            partition["after"] = row['last_id']
+        checkpoint.save()
+
+
+async def reconcile_streaks(
+    batch_size: int = 1000,
+    concurrency: int = 4,
+    state_path: Optional[str] = None,
+    today: Optional[str] = None
+) -> bool:
+    """Reset stale current streaks on every active habit.
+
+    The habit id space is split into `concurrency` keyset ranges walked in
+    parallel, `batch_size` habits per round trip. Each chunk is its own
+    short transaction on the server and progress is checkpointed to
+    `state_path`, so an interrupted run picks up where it stopped.
+    """
+    today = today or datetime.now(timezone.utc).date().isoformat()
+    checkpoint = Checkpoint(state_path, today, concurrency)
+    totals = {"scanned": 0, "reset": 0}
+    started = time.monotonic()
+
+    async def report():
+        while True:
+            await asyncio.sleep(10)
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"Scanned {totals['scanned']} habits, reset {totals['reset']} "
+                f"({totals['scanned'] / elapsed:.0f} habits/s)"
+            )
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(*(
+            _reconcile_partition(partition, today, batch_size, checkpoint, totals)
+            for partition in checkpoint.partitions
+            if not partition["done"]
+        ))
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Reconciliation for {today} completed: scanned {totals['scanned']} habits, "
+            f"reset {totals['reset']} in {elapsed:.1f}s "
+            f"({totals['scanned'] / elapsed if elapsed else 0:.0f} habits/s)"
+        )
+        checkpoint.clear()
+        return True
+    except Exception as e:
+        logger.error(f"Reconciliation failed; re-run to resume from {state_path}: {str(e)}")
+        return False
+    finally:
+        reporter.cancel()
+        await db.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reset current streaks of habits not completed since before yesterday")
+    parser.add_argument("--batch-size", type=int, default=1000, help="habits scanned per round trip")
+    parser.add_argument("--concurrency", type=int, default=4, help="id ranges processed in parallel")
+    parser.add_argument("--state", default="reconcile_streaks.state.json", help="checkpoint file used to resume")
+    parser.add_argument("--today", help="reconcile as of this UTC date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    if not asyncio.run(reconcile_streaks(args.batch_size, args.concurrency, args.state, args.today)):
+        sys.exit(1)
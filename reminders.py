@@ -0,0 +1,275 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Set
+from database import db
+from pagination import stream_rows
+
+logger = logging.getLogger(__name__)
+
+# Reminder settings. Reminder times are wall-clock UTC. Enable dispatch on
+# exactly one worker, otherwise every worker sends the same reminders; habit
+# writes served by other workers reach it through the periodic sync.
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "false").lower() == "true"
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))  # reminders per sink call
+REMINDER_LOAD_CHUNK_SIZE = int(os.getenv("REMINDER_LOAD_CHUNK_SIZE", "1000"))  # habits per load round trip
+REMINDER_SYNC_INTERVAL = float(os.getenv("REMINDER_SYNC_INTERVAL", "60"))  # seconds between incremental syncs
+# Re-read this much before the previous sync, covering clock skew and
+# transactions that committed after it with an earlier updated_at
+REMINDER_SYNC_OVERLAP = timedelta(seconds=float(os.getenv("REMINDER_SYNC_OVERLAP", "300")))
+REMINDER_VERIFY_CHUNK_SIZE = 100  # habit ids per `in` filter, keeps request URLs short
+
+REMINDER_COLUMNS = "id, user_id, name, reminder_time, is_archived"
+
+MINUTES_PER_DAY = 24 * 60
+
+
+@dataclass(frozen=True)
+class Reminder:
+    habit_id: str
+    user_id: str
+    name: str
+    minute: int  # minute of the day, 0-1439
+
+
+class ReminderSink:
+    """Where due reminders are delivered (push service, email queue, ...)."""
+
+    async def send(self, reminders: List[Reminder]) -> None:
+        raise NotImplementedError
+
+
+class LoggingSink(ReminderSink):
+    async def send(self, reminders: List[Reminder]) -> None:
+        logger.info("Dispatching %s reminder(s)", len(reminders))
+
+
+class InMemorySink(ReminderSink):
+    """Keeps every dispatched batch; a local stand-in for a real delivery service."""
+
+    def __init__(self):
+        self.batches: List[List[Reminder]] = []
+
+    async def send(self, reminders: List[Reminder]) -> None:
+        self.batches.append(list(reminders))
+
+
+def _minute_of_day(value) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+class TimingWheel:
+    """One slot per minute of the day, each holding the reminders due then.
+
+    Scheduling, rescheduling and removal are O(1) through the habit -> slot
+    index; collecting a minute's reminders only touches that slot.
+    """
+
+    def __init__(self):
+        self.slots: List[Dict[str, Reminder]] = [{} for _ in range(MINUTES_PER_DAY)]
+        self._slot_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def add(self, reminder: Reminder) -> None:
+        self.remove(reminder.habit_id)
+        self.slots[reminder.minute][reminder.habit_id] = reminder
+        self._slot_of[reminder.habit_id] = reminder.minute
+
+    def remove(self, habit_id: str) -> None:
+        minute = self._slot_of.pop(habit_id, None)
+        if minute is not None:
+            self.slots[minute].pop(habit_id, None)
+
+    def due(self, minute: int) -> List[Reminder]:
+        return list(self.slots[minute].values())
+
+
+class ReminderScheduler:
+    """Keeps the timing wheel in step with the habits table and dispatches each minute."""
+
+    def __init__(self, sink: Optional[ReminderSink] = None, batch_size: int = REMINDER_BATCH_SIZE):
+        self.sink = sink if sink is not None else LoggingSink()
+        self.batch_size = batch_size
+        self.wheel = TimingWheel()
+        self.dispatched = 0
+        self._running = False
+        self._last_minute: Optional[int] = None
+        # Habits changed through the API while the initial load is running;
+        # the load must not overwrite them with the older rows it reads
+        self._touched: Optional[Set[str]] = None
+        # Habits updated since then are re-read by the next sync
+        self._synced_since: Optional[datetime] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def schedule(self, habit: Dict) -> None:
+        """Add, move or drop a habit's reminder after it was created, edited or archived."""
+        if not self._running:
+            return
+        if self._touched is not None:
+            self._touched.add(str(habit['id']))
+        self._apply(habit)
+
+    def unschedule(self, habit_id: str) -> None:
+        if not self._running:
+            return
+        if self._touched is not None:
+            self._touched.add(habit_id)
+        self.wheel.remove(habit_id)
+
+    def _apply(self, habit: Dict) -> None:
+        habit_id = str(habit['id'])
+        minute = _minute_of_day(habit.get('reminder_time'))
+        if minute is None or habit.get('is_archived'):
+            self.wheel.remove(habit_id)
+            return
+        self.wheel.add(Reminder(habit_id, str(habit['user_id']), habit['name'], minute))
+
+    async def load(self) -> int:
+        """Fill the wheel from the database in keyset chunks; returns habits loaded.
+
+        On failure the wheel keeps what it has and `sync` retries the load.
+        """
+        self._touched = set()
+        started = datetime.now(timezone.utc)
+        loaded = 0
+        try:
+            def build_query():
+                return db.from_('habits')\
+                    .select(f"{REMINDER_COLUMNS}, created_at")\
+                    .not_.is_('reminder_time', 'null')\
+                    .eq('is_archived', False)
+
+            async for habit in stream_rows(build_query, 'created_at', chunk_size=REMINDER_LOAD_CHUNK_SIZE):
+                if str(habit['id']) not in self._touched:
+                    self._apply(habit)
+                    loaded += 1
+            self._synced_since = started
+            logger.info("Loaded %s habit reminders", loaded)
+        except Exception as e:
+            logger.error("Failed to load habit reminders after %s: %s", loaded, e)
+        finally:
+            self._touched = None
+        return loaded
+
+    async def sync(self) -> int:
+        """Apply habits created, edited or archived since the last sync, on any worker.
+
+        Deleted habits leave no row to find; `_verify` drops them when they
+        come due. Until a full load has succeeded (say the database was down
+        at startup), each sync attempts one instead.
+        """
+        if self._synced_since is None:
+            return await self.load()
+        started = datetime.now(timezone.utc)
+        since = (self._synced_since - REMINDER_SYNC_OVERLAP).isoformat()
+        synced = 0
+
+        def build_query():
+            return db.from_('habits')\
+                .select(f"{REMINDER_COLUMNS}, updated_at")\
+                .gte('updated_at', since)
+
+        async for habit in stream_rows(build_query, 'updated_at', chunk_size=REMINDER_LOAD_CHUNK_SIZE):
+            self._apply(habit)
+            synced += 1
+        self._synced_since = started
+        return synced
+
+    async def _verify(self, minute: int, due: List[Reminder]) -> List[Reminder]:
+        """The due reminders whose habit still exists, is active and is due at `minute`.
+
+        Catches habits deleted or changed on another worker since the last sync.
+        """
+        current: Dict[str, Dict] = {}
+        ids = [reminder.habit_id for reminder in due]
+        for i in range(0, len(ids), REMINDER_VERIFY_CHUNK_SIZE):
+            result = await db.from_('habits')\
+                .select(REMINDER_COLUMNS)\
+                .in_('id', ids[i:i + REMINDER_VERIFY_CHUNK_SIZE])\
+                .execute()
+            current.update({str(habit['id']): habit for habit in result.data})
+        for habit_id in ids:
+            if habit_id in current:
+                self._apply(current[habit_id])
+            else:
+                self.wheel.remove(habit_id)
+        return self.wheel.due(minute)
+
+    async def tick(self, now: Optional[datetime] = None) -> int:
+        """Dispatch every minute since the previous tick up to `now`; returns reminders sent."""
+        now = now or datetime.now(timezone.utc)
+        current = now.hour * 60 + now.minute
+        if self._last_minute is None:
+            self._last_minute = (current - 1) % MINUTES_PER_DAY
+        sent = 0
+        minute = self._last_minute
+        while minute != current:
+            minute = (minute + 1) % MINUTES_PER_DAY
+            due = self.wheel.due(minute)
+            if due:
+                try:
+                    due = await self._verify(minute, due)
+                except Exception as e:
+                    # Better a reminder for a just-deleted habit than none at all
+                    logger.error("Failed to verify %s reminder(s) for minute %s: %s", len(due), minute, e)
+            for i in range(0, len(due), self.batch_size):
+                batch = due[i:i + self.batch_size]
+                try:
+                    await self.sink.send(batch)
+                    sent += len(batch)
+                except Exception as e:
+                    logger.error("Failed to dispatch %s reminder(s) for minute %s: %s", len(batch), minute, e)
+        self._last_minute = current
+        self.dispatched += sent
+        return sent
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._tasks = [
+            asyncio.create_task(self._run()),
+            asyncio.create_task(self._sync_periodically())
+        ]
+
+    async def stop(self) -> None:
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _run(self) -> None:
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                await self.tick(now)
+            except Exception as e:
+                logger.error("Reminder tick failed: %s", e)
+            await asyncio.sleep(60 - now.second - now.microsecond / 1_000_000)
+
+
+    async def _sync_periodically(self) -> None:
+        # The first pass is the initial load
+        while True:
+            try:
+                synced = await self.sync()
+                logger.debug("Synced %s habit(s) into the reminder wheel", synced)
+            except Exception as e:
+                logger.error("Reminder sync failed: %s", e)
+            await asyncio.sleep(REMINDER_SYNC_INTERVAL)
+
+
+reminder_scheduler = ReminderScheduler()
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, List
-from database import supabase_client
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Dict, List, Optional
+from database import db
 import logging
-from auth import get_current_user
+from etags import conditional_get, user_versions
+from cache import analytics_cache
+from singleflight import single_flight
 from datetime import datetime, timedelta
 from pydantic import BaseModel
+from models import AnalyticsOverview
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 logger = logging.getLogger(__name__)
@@ -17,71 +20,136 @@ class HabitPerformance(BaseModel):
     streak_count: int
     longest_streak: int
 
-@router.get("/summary")
-async def get_analytics_summary(user_id: str = Depends(get_current_user)) -> Dict:
-    try:
-        habits = supabase_client.from_('habits').select("*").eq('user_id', user_id).execute()
-        entries = supabase_client.from_('habit_entries').select("*").eq('user_id', user_id).execute()
-        
-        # Calculate current streak (max streak among all habits)
-        current_streak = max([h.get('streak_count', 0) for h in habits.data]) if habits.data else 0
+class DailyCompletions(BaseModel):
+    date: str
+    completions: int
 
-        # Calculate longest streak (max longest_streak among all habits)
-        longest_streak = max([h.get('longest_streak', 0) for h in habits.data]) if habits.data else 0
-        
-        return {
-            "total_habits": len(habits.data),
-            "total_entries": len(entries.data),
-            "active_habits": len([h for h in habits.data if not h.get('is_archived', False)]),
-            "current_streak": current_streak,
-            "longest_streak": longest_streak
+def performance_view(rows: List[Dict], window_days: int) -> List[Dict]:
+    """Shape per-habit completion counts over a window, best completion rate first."""
+    performance_data = [
+        {
+            "id": row['id'],
+            "name": row['name'],
+            "category": row['category'],
+            "completion_rate": round(row['completions'] / window_days * 100, 1),
+            "streak_count": row['streak_count'] or 0,
+            "longest_streak": row['longest_streak'] or 0
         }
+        for row in rows
+    ]
+    performance_data.sort(key=lambda x: x['completion_rate'], reverse=True)
+    return performance_data
+
+async def load_summary(user_id: str) -> Dict:
+    """Summary from the cache, or from one (coalesced) RPC call."""
+    cached = await analytics_cache.get(user_id, "summary")
+    if cached is not None:
+        return cached
+    
+    version = await user_versions.get(user_id)
+    
+    async def fetch():
+        # Counts and maxima are computed server-side from the daily rollup in a single round trip
+        result = await db.rpc('analytics_summary', {'p_user_id': user_id}).execute()
+        summary = result.data[0] if result.data else {}
+        summary_data = {
+            "total_habits": summary.get('total_habits', 0),
+            "total_entries": summary.get('total_entries', 0),
+            "active_habits": summary.get('active_habits', 0),
+            "current_streak": summary.get('current_streak', 0),
+            "longest_streak": summary.get('longest_streak', 0)
+        }
+        # Don't cache a result a concurrent write has already made stale
+        if await user_versions.get(user_id) == version:
+            await analytics_cache.set(user_id, "summary", value=summary_data)
+        return summary_data
+    
+    return await single_flight.do((user_id, version, "summary"), fetch)
+
+@router.get("/summary", response_model=AnalyticsOverview)
+async def get_analytics_summary(user_id: str = Depends(conditional_get)) -> Dict:
+    try:
+        return await load_summary(user_id)
     except Exception as e:
-        logger.error(f"Failed to fetch analytics summary: {str(e)}")
+        logger.error("Failed to fetch analytics summary: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
 @router.get("/performance", response_model=List[HabitPerformance])
-async def get_habit_performance(user_id: str = Depends(get_current_user)) -> List[Dict]:
+async def get_habit_performance(
+    user_id: str = Depends(conditional_get),
+    window_days: int = Query(30, ge=1, le=366),
+    category: Optional[str] = None
+) -> List[Dict]:
     try:
-        # Get all habits
-        habits = supabase_client.from_('habits').select("*").eq('user_id', user_id).execute()
+        cached = await analytics_cache.get(user_id, "performance", window_days, category)
+        if cached is not None:
+            return cached
         
-        # Get entries for the last 30 days
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        entries = supabase_client.from_('habit_entries')\
-            .select("*")\
-            .eq('user_id', user_id)\
-            .gte('completed_at', start_date.strftime('%Y-%m-%d'))\
-            .lte('completed_at', end_date.strftime('%Y-%m-%d'))\
-            .execute()
-
-        # Calculate performance for each habit
-        performance_data = []
-        for habit in habits.data:
-            # Count entries for this habit
-            habit_entries = [e for e in entries.data if e['habit_id'] == habit['id']]
-            completion_rate = (len(habit_entries) / 30) * 100  # 30 days period
-
-            performance_data.append({
-                "id": habit['id'],
-                "name": habit['name'],
-                "category": habit['category'],
-                "completion_rate": round(completion_rate, 1),
-                "streak_count": habit.get('streak_count', 0),
-                "longest_streak": habit.get('longest_streak', 0)
-            })
+        version = await user_versions.get(user_id)
+        
+        async def fetch():
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=window_days)
+            
+            # Completion counts are grouped per habit from the daily rollup
+            result = await db.rpc('habit_performance', {
+                'p_user_id': user_id,
+                'p_start': start_date.strftime('%Y-%m-%d'),
+                'p_end': end_date.strftime('%Y-%m-%d'),
+                'p_category': category
+            }).execute()
+            performance_data = performance_view(result.data, window_days)
+            
+            if await user_versions.get(user_id) == version:
+                await analytics_cache.set(user_id, "performance", window_days, category, value=performance_data)
+            return performance_data
+        
+        return await single_flight.do((user_id, version, "performance", window_days, category), fetch)
+    except Exception as e:
+        logger.error("Failed to fetch habit performance: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        ) 
 
-        # Sort by completion rate descending
-        performance_data.sort(key=lambda x: x['completion_rate'], reverse=True)
+@router.get("/history", response_model=List[DailyCompletions])
+async def get_completion_history(
+    user_id: str = Depends(conditional_get),
+    days: int = Query(30, ge=1, le=366),
+    habit_id: Optional[str] = None
+) -> List[Dict]:
+    try:
+        cached = await analytics_cache.get(user_id, "history", days, habit_id)
+        if cached is not None:
+            return cached
         
-        return performance_data
+        version = await user_versions.get(user_id)
+        start_date = datetime.now() - timedelta(days=days)
+        
+        # One rollup row per habit per day, summed across habits here
+        query = db.from_('habit_daily_stats')\
+            .select("day, completions")\
+            .eq('user_id', user_id)\
+            .gte('day', start_date.strftime('%Y-%m-%d'))
+        if habit_id:
+            query = query.eq('habit_id', habit_id)
+        result = await query.execute()
+        
+        totals: Dict[str, int] = {}
+        for row in result.data:
+            totals[row['day']] = totals.get(row['day'], 0) + row['completions']
+        history = [{"date": day, "completions": count} for day, count in sorted(totals.items())]
+        
+        # Don't cache a result a concurrent write has already made stale
+        if await user_versions.get(user_id) == version:
+            await analytics_cache.set(user_id, "history", days, habit_id, value=history)
+        return history
     except Exception as e:
-        logger.error(f"Failed to fetch habit performance: {str(e)}")
+        logger.error("Failed to fetch completion history: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
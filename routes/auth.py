@@ -1,12 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends, Response, Body
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import Dict
-from database import supabase_client
+from database import db
 import logging
-import traceback
-from datetime import datetime
-from auth import create_access_token
+from auth import issue_tokens, refresh_tokens, revoke_sessions, get_current_user
 from pydantic import BaseModel
+from models import Token, Message
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 logger = logging.getLogger(__name__)
@@ -16,13 +15,13 @@ class SignupRequest(BaseModel):
     email: str
     password: str
 
-@router.post("/signin")
+@router.post("/signin", response_model=Token)
 async def signin(form_data: OAuth2PasswordRequestForm = Depends()) -> Dict:
     try:
-        logger.info(f"Attempting login for user: {form_data.username}")
+        logger.info("Attempting login for user: %s", form_data.username)
         
         # Sign in with Supabase
-        auth_response = supabase_client.auth.sign_in_with_password({
+        auth_response = await db.auth.sign_in_with_password({
             "email": form_data.username,
             "password": form_data.password
         })
@@ -34,47 +33,39 @@ async def signin(form_data: OAuth2PasswordRequestForm = Depends()) -> Dict:
                 detail="Incorrect email or password"
             )
         
-        # Create our own JWT token
-        token = create_access_token(
-            user_id=auth_response.user.id,
-            email=auth_response.user.email
-        )
-        
         logger.info("Login successful")
-        return {
-            "access_token": token,
-            "token_type": "bearer"
-        }
+        # Our own short-lived access token plus a refresh token to renew it
+        return issue_tokens(auth_response.user.id, auth_response.user.email)
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        logger.error(f"Login error: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
         if "Invalid login credentials" in str(e):
+            logger.warning("Login failed for user: %s", form_data.username)
             raise HTTPException(
                 status_code=401,
                 detail="Incorrect email or password"
             )
+        logger.error("Login error: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
-@router.post("/signup")
+async def _username_taken(username: str) -> bool:
+    existing = await db.from_('users').select("id").eq('username', username).limit(1).execute()
+    return bool(existing.data)
+
+@router.post("/signup", response_model=Token)
 async def signup(signup_data: SignupRequest) -> Dict:
     try:
         email = signup_data.email.lower().strip()
         username = signup_data.username.strip()
-        logger.info(f"Attempting to create user: {email}")
-        
-        # Check if username is taken
-        existing_user = supabase_client.from_('users').select("*").eq('username', username).execute()
-        if existing_user.data:
-            raise HTTPException(
-                status_code=400,
-                detail="Username already taken"
-            )
+        logger.info("Attempting to create user: %s", email)
         
-        # Sign up with Supabase
-        auth_response = supabase_client.auth.sign_up({
+        # One call: the on_auth_user_created trigger inserts the public.users
+        # row in the same transaction, so a failure there (e.g. a taken
+        # username) leaves no auth user behind
+        auth_response = await db.auth.sign_up({
             "email": email,
             "password": signup_data.password,
             "options": {
@@ -91,64 +82,63 @@ async def signup(signup_data: SignupRequest) -> Dict:
                 status_code=400,
                 detail="Failed to create user"
             )
-
-        # Create user record in public.users table
-        try:
-            user_data = {
-                "id": auth_response.user.id,
-                "username": username,
-                "email": email,
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            }
-            supabase_client.from_('users').insert(user_data).execute()
-            logger.info(f"User record created in public.users: {auth_response.user.id}")
-        except Exception as e:
-            logger.error(f"Failed to create user record in public.users: {str(e)}")
-            # Clean up auth user if user record creation fails
-            try:
-                supabase_client.auth.admin.delete_user(auth_response.user.id)
-            except:
-                pass
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to create user record"
-            )
         
-        # Create JWT token immediately after signup
-        token = create_access_token(
-            user_id=auth_response.user.id,
-            email=auth_response.user.email
-        )
-        return {
-            "access_token": token,
-            "token_type": "bearer"
-        }
+        logger.info("User created: %s", auth_response.user.id)
+        return issue_tokens(auth_response.user.id, auth_response.user.email)
             
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Signup error: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
         if "already registered" in str(e).lower():
+            logger.warning("Signup rejected, email already registered: %s", email)
             raise HTTPException(
                 status_code=400,
                 detail="Email already registered"
             )
+        if "database error saving new user" in str(e).lower():
+            # The auth API reports any failure of the users trigger this way;
+            # only a username that now exists tells a taken one apart
+            if await _username_taken(username):
+                logger.warning("Signup rejected, username taken: %s", username)
+                raise HTTPException(
+                    status_code=400,
+                    detail="Username already taken"
+                )
+            logger.error("Signup failed creating the user record for %s: %s", email, e)
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to create user"
+            )
+        logger.error("Signup error: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+@router.post("/refresh", response_model=Token)
+async def refresh(refresh_token: str = Body(..., embed=True)) -> Dict:
+    """Renew the access token. Verified locally, no auth provider round trip."""
+    try:
+        return await refresh_tokens(refresh_token)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Token refresh error: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
-@router.post("/logout")
-async def logout(response: Response) -> Dict:
+@router.post("/logout", response_model=Message)
+async def logout(response: Response, user_id: str = Depends(get_current_user)) -> Dict:
     try:
-        logger.info("Attempting to logout user")
+        logger.info("Attempting to logout user %s", user_id)
+        # Ends all of the user's sessions; refresh tokens carry no id to revoke one alone
+        await revoke_sessions(user_id)
         response.delete_cookie(key="token")
         return {"message": "Successfully logged out"}
     except Exception as e:
-        logger.error(f"Logout error: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error("Logout error: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to logout: {str(e)}"
@@ -158,15 +148,14 @@ async def logout(response: Response) -> Dict:
 async def test_connection():
     try:
         # Test database connection
-        response = supabase_client.from_('users').select("*").execute()
+        response = await db.from_('users').select("id", count="exact").limit(1).execute()
         return {
             "status": "success",
             "message": "Database connection successful",
-            "user_count": len(response.data)
+            "user_count": response.count
         }
     except Exception as e:
-        logger.error(f"Test connection failed: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error("Test connection failed: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=str(e)
@@ -0,0 +1,174 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Dict, List, Literal, Optional
+from database import db
+import logging
+from etags import conditional_get, user_versions
+from cache import analytics_cache
+from datetime import date
+from models import HabitCalendar, HabitAnalytics, AnalyticsSummary
+from bitmaps import (
+    build_year_bitmap, encode_base64, encode_rle, bitmap_days,
+    completed_count, days_in_year
+)
+from streaks import streak_as_of, parse_day
+
+router = APIRouter(prefix="/habits", tags=["calendar"])
+logger = logging.getLogger(__name__)
+
+async def load_year_bitmaps(user_id: str, habit_ids: List[str], year: int) -> Dict[str, bytes]:
+    """Per-habit completion bitmaps for `year`, served from the cache where possible.
+
+    Cached bitmaps are dropped with the rest of the user's analytics whenever
+    one of their habits or entries changes.
+    """
+    bitmaps = {}
+    missing = []
+    for habit_id in habit_ids:
+        cached = await analytics_cache.get(user_id, "calendar", habit_id, year)
+        if cached is not None:
+            bitmaps[habit_id] = cached
+        else:
+            missing.append(habit_id)
+    
+    if missing:
+        version = await user_versions.get(user_id)
+        result = await db.rpc('habit_calendar_days', {
+            'p_user_id': user_id,
+            'p_habit_ids': missing,
+            'p_start': f"{year}-01-01",
+            'p_end': f"{year}-12-31"
+        }).execute()
+        days_by_habit = {row['habit_id']: row['days'] for row in result.data}
+        # Don't cache results a concurrent write has already made stale
+        unchanged = await user_versions.get(user_id) == version
+        for habit_id in missing:
+            days = [date.fromisoformat(d) for d in days_by_habit.get(habit_id) or []]
+            bitmap = build_year_bitmap(year, days)
+            if unchanged:
+                await analytics_cache.set(user_id, "calendar", habit_id, year, value=bitmap)
+            bitmaps[habit_id] = bitmap
+    return bitmaps
+
+def _calendar(habit_id: str, year: int, bitmap: bytes, encoding: str) -> Dict:
+    n_days = days_in_year(year)
+    calendar = {
+        "habit_id": habit_id,
+        "year": year,
+        "days": n_days,
+        "completed_days": completed_count(bitmap),
+        "encoding": encoding
+    }
+    if encoding == "rle":
+        calendar["runs"] = encode_rle(bitmap, n_days)
+    else:
+        calendar["bitmap"] = encode_base64(bitmap)
+    return calendar
+
+async def _verify_habit(habit_id: str, user_id: str) -> None:
+    habit = await db.from_('habits').select("id").eq('id', habit_id).eq('user_id', user_id).execute()
+    if not habit.data:
+        raise HTTPException(status_code=404, detail="Habit not found")
+
+@router.get("/calendar", response_model=List[HabitCalendar], response_model_exclude_none=True)
+async def get_calendars(
+    user_id: str = Depends(conditional_get),
+    year: Optional[int] = Query(None, ge=1970, le=2100),
+    habit_ids: Optional[str] = None,
+    encoding: Literal["base64", "rle"] = "base64"
+) -> List[Dict]:
+    year = year or date.today().year
+    try:
+        # Only the caller's habits; defaults to all of their active habits
+        query = db.from_('habits').select("id").eq('user_id', user_id)
+        if habit_ids:
+            query = query.in_('id', [h.strip() for h in habit_ids.split(",") if h.strip()])
+        else:
+            query = query.eq('is_archived', False)
+        habits = await query.execute()
+        ids = [h['id'] for h in habits.data]
+        
+        bitmaps = await load_year_bitmaps(user_id, ids, year)
+        return [_calendar(habit_id, year, bitmaps[habit_id], encoding) for habit_id in ids]
+    except Exception as e:
+        logger.error("Failed to fetch habit calendars: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+@router.get("/{habit_id}/calendar", response_model=HabitCalendar, response_model_exclude_none=True)
+async def get_calendar(
+    habit_id: str,
+    user_id: str = Depends(conditional_get),
+    year: Optional[int] = Query(None, ge=1970, le=2100),
+    encoding: Literal["base64", "rle"] = "base64"
+) -> Dict:
+    year = year or date.today().year
+    try:
+        bitmap = await analytics_cache.get(user_id, "calendar", habit_id, year)
+        if bitmap is None:
+            await _verify_habit(habit_id, user_id)
+            bitmap = (await load_year_bitmaps(user_id, [habit_id], year))[habit_id]
+        return _calendar(habit_id, year, bitmap, encoding)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Failed to fetch habit calendar: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+@router.get("/{habit_id}/analytics", response_model=HabitAnalytics)
+async def get_habit_analytics(
+    habit_id: str,
+    user_id: str = Depends(conditional_get),
+    year: Optional[int] = Query(None, ge=1970, le=2100)
+) -> Dict:
+    year = year or date.today().year
+    try:
+        habit = await db.from_('habits')\
+            .select("streak_count, longest_streak, last_completed_date")\
+            .eq('id', habit_id)\
+            .eq('user_id', user_id)\
+            .execute()
+        if not habit.data:
+            raise HTTPException(status_code=404, detail="Habit not found")
+        bitmap = await analytics_cache.get(user_id, "calendar", habit_id, year)
+        if bitmap is None:
+            bitmap = (await load_year_bitmaps(user_id, [habit_id], year))[habit_id]
+        
+        # Streaks are the habit's all-time values, which one year's bitmap
+        # can't give (runs cross Jan 1); history and rate come from the bitmap
+        row = habit.data[0]
+        current_streak, longest_streak, _ = streak_as_of(
+            row.get('streak_count') or 0,
+            row.get('longest_streak') or 0,
+            parse_day(row.get('last_completed_date'))
+        )
+        today = date.today()
+        if year == today.year:
+            last_index = (today - date(year, 1, 1)).days
+        elif year < today.year:
+            last_index = days_in_year(year) - 1
+        else:
+            last_index = -1
+        total = completed_count(bitmap)
+        
+        return HabitAnalytics(
+            streak_data=AnalyticsSummary(
+                current_streak=current_streak,
+                longest_streak=longest_streak,
+                completion_rate=round(total / (last_index + 1) * 100, 1) if last_index >= 0 else 0.0,
+                total_completions=total
+            ),
+            completion_history=bitmap_days(year, bitmap)
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Failed to fetch habit analytics: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Dict, List
+from database import db
+import asyncio
+import logging
+from etags import conditional_get, user_versions
+from cache import analytics_cache
+from singleflight import single_flight
+from datetime import datetime, timedelta
+from pydantic import BaseModel
+from models import Habit, AnalyticsOverview
+from routes.habits import HABIT_COLUMNS
+from routes.analytics import HabitPerformance, load_summary, performance_view
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+logger = logging.getLogger(__name__)
+
+class Dashboard(BaseModel):
+    habits: List[Habit]
+    summary: AnalyticsOverview
+    performance: List[HabitPerformance]
+
+async def _all_habits(user_id: str) -> List[Dict]:
+    result = await db.from_('habits')\
+        .select(HABIT_COLUMNS)\
+        .eq('user_id', user_id)\
+        .order('created_at')\
+        .execute()
+    return result.data
+
+async def _window_completions(user_id: str, start: str, end: str) -> Dict[str, int]:
+    result = await db.from_('habit_daily_stats')\
+        .select("habit_id, completions")\
+        .eq('user_id', user_id)\
+        .gte('day', start)\
+        .lte('day', end)\
+        .execute()
+    completions: Dict[str, int] = {}
+    for row in result.data:
+        completions[row['habit_id']] = completions.get(row['habit_id'], 0) + row['completions']
+    return completions
+
+@router.get("/", response_model=Dashboard)
+async def get_dashboard(
+    user_id: str = Depends(conditional_get),
+    window_days: int = Query(30, ge=1, le=366)
+) -> Dict:
+    """The home screen in one request: active habits, summary and performance.
+
+    Habit rows are read once and shared by all three views; the remaining
+    reads run concurrently and are coalesced with identical in-flight ones.
+    """
+    try:
+        version = await user_versions.get(user_id)
+        performance = await analytics_cache.get(user_id, "performance", window_days, None)
+
+        end_date = datetime.now().strftime('%Y-%m-%d')
+        start_date = (datetime.now() - timedelta(days=window_days)).strftime('%Y-%m-%d')
+        reads = [
+            single_flight.do((user_id, version, "habits"), lambda: _all_habits(user_id)),
+            load_summary(user_id)
+        ]
+        if performance is None:
+            reads.append(single_flight.do(
+                (user_id, version, "window", start_date, end_date),
+                lambda: _window_completions(user_id, start_date, end_date)
+            ))
+        habits, summary, *window = await asyncio.gather(*reads)
+
+        if performance is None:
+            completions = window[0]
+            performance = performance_view(
+                [{**habit, 'completions': completions.get(habit['id'], 0)} for habit in habits],
+                window_days
+            )
+            if await user_versions.get(user_id) == version:
+                await analytics_cache.set(user_id, "performance", window_days, None, value=performance)
+
+        return {
+            "habits": [habit for habit in habits if not habit.get('is_archived')],
+            "summary": summary,
+            "performance": performance
+        }
+    except Exception as e:
+        logger.error("Failed to build dashboard: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, Dict, Any
+import os
+import logging
+import orjson
+from auth import get_stream_user
+from pubsub import user_events, Subscription
+
+router = APIRouter(prefix="/events", tags=["events"])
+logger = logging.getLogger(__name__)
+
+# Comment line sent on idle streams so proxies and load balancers keep them open
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "20"))
+# How long EventSource clients wait before reconnecting
+EVENT_RETRY_MS = int(os.getenv("EVENT_RETRY_MS", "5000"))
+
+def _format_event(seq: int, event: Dict[str, Any]) -> bytes:
+    data = orjson.dumps(event["data"], default=str)
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (seq, event["type"].encode(), data)
+
+async def _stream(subscription: Subscription) -> AsyncIterator[bytes]:
+    try:
+        yield b"retry: %d\n\n" % EVENT_RETRY_MS
+        seq = 0
+        while True:
+            event = await subscription.next(EVENT_HEARTBEAT_SECONDS)
+            if event is None:
+                yield b": ping\n\n"
+                continue
+            seq += 1
+            yield _format_event(seq, event)
+    finally:
+        # Runs when the client disconnects and the response task is cancelled
+        user_events.backend.unsubscribe(subscription)
+
+@router.get("/")
+async def stream_events(user_id: str = Depends(get_stream_user)) -> StreamingResponse:
+    """Server-Sent Events stream of the user's changes.
+
+    Events are small deltas published by the write endpoints
+    (`habit_created`, `habit_updated`, `habit_deleted`, `entry_created`,
+    `streaks_updated`), so connected clients don't need to poll the analytics
+    endpoints. A `resync` event means deltas were dropped because the client
+    fell behind and it should refetch. An idle stream costs one small queue
+    and one sleeping task, with a heartbeat every EVENT_HEARTBEAT_SECONDS.
+    """
+    try:
+        subscription = user_events.backend.subscribe(user_id)
+    except OverflowError as e:
+        logger.warning("Refusing event stream: %s", e)
+        raise HTTPException(status_code=429, detail="Too many open event streams")
+
+    return StreamingResponse(
+        _stream(subscription),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx from buffering the stream
+            "X-Accel-Buffering": "no"
+        },
+        # Also covers a client that disconnects before the stream starts;
+        # unsubscribing twice is harmless
+        background=BackgroundTask(user_events.backend.unsubscribe, subscription)
+    )
@@ -1,47 +1,219 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict
-from database import supabase_client
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Dict, Literal, Optional, Union
+from database import db
+import csv
+import io
 import logging
-from pydantic import BaseModel
-from datetime import datetime
-from auth import get_current_user
+from pydantic import BaseModel, Field, field_validator
+from datetime import date, datetime, time
+from auth import get_current_user, user_exists
+from streaks import advance_streak, recompute_streak, streak_as_of, parse_day
+from etags import conditional_get, invalidate_user
+from pagination import fetch_page, stream_rows, ndjson, csv_lines, wants_ndjson, NDJSON_MEDIA_TYPE
+from models import Habit, HabitEntry, HabitEntryCreated, EntryBatchResult, Message
+from ingest import ingest_entries
+from reminders import reminder_scheduler
+from pubsub import user_events
+from uuid import UUID
 
 router = APIRouter(prefix="/habits", tags=["habits"])
 logger = logging.getLogger(__name__)
 
+# Keyset pagination defaults for list endpoints
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+# Bulk ingestion limits
+MAX_BATCH_ENTRIES = 10000
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+
+# Columns returned to clients; keep in sync with models.Habit and models.HabitEntry
+HABIT_COLUMNS = "id, user_id, name, category, color, description, reminder_time, is_archived, archived_at, streak_count, longest_streak, last_completed_date, created_at, updated_at"
+ENTRY_COLUMNS = "id, habit_id, user_id, completed_at, created_at"
+
+# One CSV layout for both record types; columns a record lacks are left empty
+EXPORT_CSV_COLUMNS = [
+    "record_type", "id", "habit_id", "name", "category", "color", "description", "reminder_time",
+    "is_archived", "archived_at", "streak_count", "longest_streak", "last_completed_date",
+    "completed_at", "created_at", "updated_at"
+]
+
 class HabitCreate(BaseModel):
     name: str
     category: str
     color: str
     description: str | None = None
+    reminder_time: time | None = None
+
+class HabitUpdate(BaseModel):
+    name: str | None = None
+    category: str | None = None
+    color: str | None = None
+    description: str | None = None
+    reminder_time: time | None = None
+
+    @field_validator('name', 'category', 'color')
+    @classmethod
+    def not_null(cls, value: str | None) -> str:
+        # Omit these to leave them unchanged; only description and reminder_time can be cleared
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
 
 class HabitEntryCreate(BaseModel):
     date: str
 
-@router.get("/")
-async def get_habits(user_id: str = Depends(get_current_user), include_archived: bool = False) -> List[Dict]:
+class EntryBatchItem(BaseModel):
+    habit_id: UUID
+    date: date
+
+class EntryBatch(BaseModel):
+    entries: List[EntryBatchItem] = Field(min_length=1, max_length=MAX_BATCH_ENTRIES)
+
+@router.get("/", response_model=List[Habit])
+async def get_habits(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(conditional_get),
+    include_archived: bool = False,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None
+) -> List[Dict]:
+    try:
+        def build_query():
+            query = db.from_('habits').select(HABIT_COLUMNS).eq('user_id', user_id)
+            if not include_archived:
+                query = query.eq('is_archived', False)
+            return query
+        
+        if wants_ndjson(request):
+            return StreamingResponse(
+                ndjson(stream_rows(build_query, 'created_at', cursor)),
+                media_type=NDJSON_MEDIA_TYPE
+            )
+        
+        rows, next_cursor = await fetch_page(build_query, 'created_at', cursor, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return rows
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Failed to fetch habits: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+async def _export_records(user_id: str, since: Optional[Union[datetime, date]]) -> AsyncIterator[Dict]:
+    """Every habit, then every entry, of one user, read from the database in fixed-size chunks."""
+    def habits_query():
+        query = db.from_('habits').select(HABIT_COLUMNS).eq('user_id', user_id)
+        if since:
+            query = query.gte('updated_at', since.isoformat())
+        return query
+    
+    def entries_query():
+        query = db.from_('habit_entries').select(ENTRY_COLUMNS).eq('user_id', user_id)
+        if since:
+            query = query.gte('created_at', since.isoformat())
+        return query
+    
+    async for habit in stream_rows(habits_query, 'created_at'):
+        yield {"record_type": "habit", **habit}
+    async for entry in stream_rows(entries_query, 'created_at'):
+        yield {"record_type": "entry", **entry}
+
+@router.get("/export")
+async def export_history(
+    user_id: str = Depends(get_current_user),
+    format: Literal["csv", "ndjson"] = "ndjson",
+    since: Optional[Union[datetime, date]] = None
+) -> StreamingResponse:
+    """Stream the caller's habits and entries; `since` limits it to records changed after that time."""
+    logger.info("Exporting history for user %s as %s since %s", user_id, format, since)
+    records = _export_records(user_id, since)
+    if format == "csv":
+        body, media_type = csv_lines(records, EXPORT_CSV_COLUMNS), "text/csv"
+    else:
+        body, media_type = ndjson(records), NDJSON_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="habits-export.{format}"'}
+    )
+
+@router.post("/entries:batch", response_model=EntryBatchResult)
+async def create_entries_batch(batch: EntryBatch, user_id: str = Depends(get_current_user)) -> Dict:
     try:
-        response = supabase_client.from_('habits').select("*").eq('user_id', user_id)
-        if not include_archived:
-            response = response.eq('is_archived', False)
-        result = response.execute()
-        return result.data
+        logger.info("Ingesting %s entries for user %s", len(batch.entries), user_id)
+        result = await ingest_entries(user_id, ((str(e.habit_id), e.date) for e in batch.entries))
+        if result["inserted"] or result["habits"]:
+            await invalidate_user(user_id)
+            await user_events.publish(user_id, "streaks_updated", {
+                "entries_added": result["inserted"],
+                "habits": result["habits"]
+            })
+        return result
     except Exception as e:
-        logger.error(f"Failed to fetch habits: {str(e)}")
+        logger.error("Failed to ingest habit entries: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
-@router.post("/")
+@router.post("/entries:import", response_model=EntryBatchResult)
+async def import_entries_csv(file: UploadFile = File(...), user_id: str = Depends(get_current_user)) -> Dict:
+    """Import check-ins from a CSV with `habit_id` and `date` (or `completed_at`) columns."""
+    try:
+        content = await file.read(MAX_IMPORT_BYTES + 1)
+        if len(content) > MAX_IMPORT_BYTES:
+            raise HTTPException(status_code=413, detail="CSV file too large")
+        
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV file must be UTF-8")
+        
+        entries, invalid = [], 0
+        for row in csv.DictReader(io.StringIO(text)):
+            try:
+                day = parse_day((row.get('date') or row.get('completed_at') or "").strip())
+                entries.append((str(UUID(row['habit_id'].strip())), day))
+            except (KeyError, AttributeError, ValueError):
+                invalid += 1
+        if len(entries) > MAX_BATCH_ENTRIES:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ENTRIES} entries per import")
+        
+        logger.info("Importing %s entries for user %s", len(entries), user_id)
+        result = await ingest_entries(user_id, entries)
+        result["received"] += invalid
+        result["rejected"] += invalid
+        if result["inserted"] or result["habits"]:
+            await invalidate_user(user_id)
+            await user_events.publish(user_id, "streaks_updated", {
+                "entries_added": result["inserted"],
+                "habits": result["habits"]
+            })
+        return result
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Failed to import habit entries: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+@router.post("/", response_model=Habit)
 async def create_habit(habit: HabitCreate, user_id: str = Depends(get_current_user)) -> Dict:
     try:
-        logger.info(f"Creating new habit: {habit.name} for user: {user_id}")
+        logger.info("Creating new habit: %s for user: %s", habit.name, user_id)
         
         # First verify that the user exists in the users table
-        user = supabase_client.from_('users').select("*").eq('id', user_id).execute()
-        if not user.data:
-            logger.error(f"User {user_id} not found in users table")
+        if not await user_exists(user_id):
+            logger.error("User %s not found in users table", user_id)
             raise HTTPException(
                 status_code=400,
                 detail="User not found. Please try logging out and logging in again."
@@ -53,6 +225,7 @@ async def create_habit(habit: HabitCreate, user_id: str = Depends(get_current_us
             "category": habit.category,
             "color": habit.color,
             "description": habit.description,
+            "reminder_time": habit.reminder_time.isoformat() if habit.reminder_time else None,
             "is_archived": False,
             "streak_count": 0,
             "longest_streak": 0,
@@ -60,7 +233,7 @@ async def create_habit(habit: HabitCreate, user_id: str = Depends(get_current_us
         }
         
         # Insert into Supabase
-        response = supabase_client.from_('habits').insert(habit_data).execute()
+        response = await db.from_('habits').insert(habit_data).execute()
         
         if not response.data:
             logger.error("Failed to create habit: No data returned")
@@ -69,78 +242,80 @@ async def create_habit(habit: HabitCreate, user_id: str = Depends(get_current_us
                 detail="Failed to create habit"
             )
         
-        logger.info(f"Habit created successfully: {response.data[0]}")
+        await invalidate_user(user_id)
+        reminder_scheduler.schedule(response.data[0])
+        await user_events.publish(user_id, "habit_created", response.data[0])
+        logger.info("Habit created successfully: %s", response.data[0]['id'])
+        return response.data[0]
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Failed to create habit: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+@router.patch("/{habit_id}", response_model=Habit)
+async def update_habit(
+    habit_id: str,
+    habit: HabitUpdate,
+    user_id: str = Depends(get_current_user)
+) -> Dict:
+    try:
+        # Only the fields the client sent; an explicit null clears description or reminder_time
+        changes = habit.model_dump(mode="json", exclude_unset=True)
+        if not changes:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        
+        response = await db.from_('habits')\
+            .update(changes)\
+            .eq('id', habit_id)\
+            .eq('user_id', user_id)\
+            .execute()
+        if not response.data:
+            raise HTTPException(status_code=404, detail="Habit not found")
+        
+        await invalidate_user(user_id)
+        reminder_scheduler.schedule(response.data[0])
+        await user_events.publish(user_id, "habit_updated", response.data[0])
         return response.data[0]
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        logger.error(f"Failed to create habit: {str(e)}")
+        logger.error("Failed to update habit: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
-@router.post("/{habit_id}/entries")
+@router.post("/{habit_id}/entries", response_model=HabitEntryCreated)
 async def create_habit_entry(
     habit_id: str, 
     entry: HabitEntryCreate, 
     user_id: str = Depends(get_current_user)
 ) -> Dict:
     try:
-        logger.info(f"Creating entry for habit {habit_id} on {entry.date}")
+        logger.info("Creating entry for habit %s on %s", habit_id, entry.date)
         
-        # Verify habit belongs to user
-        habit = supabase_client.from_('habits').select("*").eq('id', habit_id).eq('user_id', user_id).execute()
+        # Verify habit belongs to user and read its streak state
+        habit = await db.from_('habits')\
+            .select("streak_count, longest_streak, last_completed_date")\
+            .eq('id', habit_id)\
+            .eq('user_id', user_id)\
+            .execute()
         if not habit.data:
             raise HTTPException(status_code=404, detail="Habit not found")
         
-        # Get all entries for this habit, ordered by date
-        entries = supabase_client.from_('habit_entries')\
-            .select("*")\
-            .eq('habit_id', habit_id)\
-            .order('completed_at', desc=False)\
-            .execute()
-        
-        # Calculate current streak
-        current_streak = 0
         entry_date = datetime.strptime(entry.date, "%Y-%m-%d").date()
         
-        if entries.data:
-            # Convert all dates to date objects for comparison
-            completion_dates = [datetime.strptime(e['completed_at'].split('T')[0], "%Y-%m-%d").date() for e in entries.data]
-            completion_dates.append(entry_date)
-            completion_dates.sort()
-            
-            # Calculate streak
-            current_streak = 1
-            for i in range(len(completion_dates)-1, 0, -1):
-                date_diff = (completion_dates[i] - completion_dates[i-1]).days
-                if date_diff == 1:  # Consecutive days
-                    current_streak += 1
-                else:
-                    break
-        else:
-            current_streak = 1  # First entry starts streak at 1
-        
-        # Update habit with new streak information
-        longest_streak = max(current_streak, habit.data[0]['longest_streak'])
-        
-        # Update the habit's streak information
-        supabase_client.from_('habits')\
-            .update({
-                'streak_count': current_streak,
-                'longest_streak': longest_streak
-            })\
-            .eq('id', habit_id)\
-            .execute()
-        
-        # Prepare entry data
+        # Insert into Supabase
         entry_data = {
             "habit_id": habit_id,
             "completed_at": entry.date,
             "user_id": user_id
         }
-        
-        # Insert into Supabase
-        response = supabase_client.from_('habit_entries').insert(entry_data).execute()
+        response = await db.from_('habit_entries').insert(entry_data).execute()
         
         if not response.data:
             logger.error("Failed to create habit entry: No data returned")
@@ -149,77 +324,203 @@ async def create_habit_entry(
                 detail="Failed to create habit entry"
             )
         
-        logger.info(f"Habit entry created successfully: {response.data[0]}")
+        # Advance the streak from the state stored on the habit row
+        current = habit.data[0]
+        streak = advance_streak(
+            parse_day(current.get('last_completed_date')),
+            current.get('streak_count') or 0,
+            current.get('longest_streak') or 0,
+            entry_date
+        )
+        if streak is not None:
+            current_streak, longest_streak, last_completed = streak_as_of(*streak)
+            # Compare-and-set against the state read above, so a concurrent
+            # check-in that already moved the streak isn't overwritten
+            update = db.from_('habits')\
+                .update({
+                    'streak_count': current_streak,
+                    'longest_streak': longest_streak,
+                    'last_completed_date': last_completed.isoformat()
+                })\
+                .eq('id', habit_id)\
+                .eq('streak_count', current.get('streak_count') or 0)
+            if current.get('last_completed_date') is None:
+                update = update.is_('last_completed_date', 'null')
+            else:
+                update = update.eq('last_completed_date', current['last_completed_date'])
+            updated = await update.execute()
+            if not updated.data:
+                logger.info("Streak of habit %s changed concurrently", habit_id)
+                streak = None
+        
+        if streak is None:
+            # Back-dated entry, legacy habit or lost race: rebuild from the full
+            # history, which includes every entry inserted before this read
+            logger.info("Recomputing streak for habit %s", habit_id)
+            entries = await db.from_('habit_entries')\
+                .select("completed_at")\
+                .eq('habit_id', habit_id)\
+                .execute()
+            current_streak, longest_streak, last_completed = streak_as_of(*recompute_streak(
+                parse_day(e['completed_at']) for e in entries.data
+            ))
+            longest_streak = max(longest_streak, current.get('longest_streak') or 0)
+            await db.from_('habits')\
+                .update({
+                    'streak_count': current_streak,
+                    'longest_streak': longest_streak,
+                    'last_completed_date': last_completed.isoformat()
+                })\
+                .eq('id', habit_id)\
+                .execute()
+        
+        await invalidate_user(user_id)
+        await user_events.publish(user_id, "entry_created", {
+            "habit_id": habit_id,
+            "completed_at": entry.date,
+            "streak_count": current_streak,
+            "longest_streak": longest_streak
+        })
+        logger.info("Habit entry created successfully: %s", response.data[0]['id'])
         return {
             **response.data[0],
             'streak_count': current_streak,
             'longest_streak': longest_streak
         }
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        logger.error(f"Failed to create habit entry: {str(e)}")
+        logger.error("Failed to create habit entry: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
-@router.get("/{habit_id}/entries")
+@router.get("/{habit_id}/entries", response_model=List[HabitEntry])
 async def get_habit_entries(
     habit_id: str,
-    user_id: str = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    user_id: str = Depends(conditional_get),
     start_date: str | None = None,
-    end_date: str | None = None
+    end_date: str | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None
 ) -> List[Dict]:
     try:
         # Verify habit belongs to user
-        habit = supabase_client.from_('habits').select("*").eq('id', habit_id).eq('user_id', user_id).execute()
+        habit = await db.from_('habits').select("id").eq('id', habit_id).eq('user_id', user_id).execute()
         if not habit.data:
             raise HTTPException(status_code=404, detail="Habit not found")
-            
-        query = supabase_client.from_('habit_entries').select("*").eq('habit_id', habit_id).eq('user_id', user_id)
-        
-        if start_date:
-            query = query.gte('completed_at', start_date)
-        if end_date:
-            query = query.lte('completed_at', end_date)
-            
-        result = query.execute()
-        return result.data
+        
+        def build_query():
+            query = db.from_('habit_entries').select(ENTRY_COLUMNS).eq('habit_id', habit_id).eq('user_id', user_id)
+            if start_date:
+                query = query.gte('completed_at', start_date)
+            if end_date:
+                query = query.lte('completed_at', end_date)
+            return query
+        
+        if wants_ndjson(request):
+            return StreamingResponse(
+                ndjson(stream_rows(build_query, 'completed_at', cursor)),
+                media_type=NDJSON_MEDIA_TYPE
+            )
+        
+        rows, next_cursor = await fetch_page(build_query, 'completed_at', cursor, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return rows
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        logger.error(f"Failed to fetch habit entries: {str(e)}")
+        logger.error("Failed to fetch habit entries: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
         ) 
 
-@router.delete("/{habit_id}")
-async def delete_habit(habit_id: str, user_id: str = Depends(get_current_user)) -> Dict:
+@router.post("/{habit_id}/archive", response_model=Habit)
+async def archive_habit(habit_id: str, user_id: str = Depends(get_current_user)) -> Dict:
+    return await _set_archived(habit_id, user_id, True)
+
+@router.post("/{habit_id}/unarchive", response_model=Habit)
+async def unarchive_habit(habit_id: str, user_id: str = Depends(get_current_user)) -> Dict:
+    return await _set_archived(habit_id, user_id, False)
+
+async def _streak_from_history(habit_id: str, user_id: str) -> Dict:
+    """Streak columns recomputed from the daily rollup, as of today's nightly reset."""
+    days = await db.from_('habit_daily_stats')\
+        .select("day")\
+        .eq('habit_id', habit_id)\
+        .eq('user_id', user_id)\
+        .execute()
+    current, longest, last = streak_as_of(*recompute_streak(parse_day(row['day']) for row in days.data))
+    return {
+        'streak_count': current,
+        'longest_streak': longest,
+        'last_completed_date': last.isoformat() if last else None
+    }
+
+async def _set_archived(habit_id: str, user_id: str, archived: bool) -> Dict:
     try:
-        logger.info(f"Attempting to delete habit {habit_id} for user {user_id}")
+        logger.info("Setting archived=%s on habit %s for user %s", archived, habit_id, user_id)
         
-        # Verify habit belongs to user
-        habit = supabase_client.from_('habits').select("*").eq('id', habit_id).eq('user_id', user_id).execute()
-        if not habit.data:
-            raise HTTPException(status_code=404, detail="Habit not found")
+        changes = {
+            'is_archived': archived,
+            'archived_at': datetime.utcnow().isoformat() if archived else None
+        }
+        if not archived:
+            # The purge worker may have removed the entries since the habit
+            # was archived, and the nightly reset skips archived habits, so
+            # the stored streak has to be rebuilt from what history is left
+            changes.update(await _streak_from_history(habit_id, user_id))
         
-        # Delete habit entries first
-        supabase_client.from_('habit_entries').delete().eq('habit_id', habit_id).execute()
+        # Ownership is part of the filter, so archiving is a single round trip;
+        # the entries of archived habits are removed later by the purge worker
+        response = await db.from_('habits')\
+            .update(changes)\
+            .eq('id', habit_id)\
+            .eq('user_id', user_id)\
+            .execute()
+        if not response.data:
+            raise HTTPException(status_code=404, detail="Habit not found")
         
-        # Delete the habit
-        response = supabase_client.from_('habits').delete().eq('id', habit_id).execute()
+        await invalidate_user(user_id)
+        reminder_scheduler.schedule(response.data[0])
+        await user_events.publish(user_id, "habit_updated", response.data[0])
+        return response.data[0]
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Failed to update habit archive state: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+@router.delete("/{habit_id}", response_model=Message)
+async def delete_habit(habit_id: str, user_id: str = Depends(get_current_user)) -> Dict:
+    try:
+        logger.info("Attempting to delete habit %s for user %s", habit_id, user_id)
         
+        # Ownership check, habit and entries are deleted atomically on the server
+        response = await db.rpc('delete_habit', {
+            'p_habit_id': habit_id,
+            'p_user_id': user_id
+        }).execute()
         if not response.data:
-            logger.error("Failed to delete habit: No data returned")
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to delete habit"
-            )
+            raise HTTPException(status_code=404, detail="Habit not found")
         
-        logger.info(f"Habit {habit_id} deleted successfully")
+        await invalidate_user(user_id)
+        reminder_scheduler.unschedule(habit_id)
+        await user_events.publish(user_id, "habit_deleted", {"habit_id": habit_id})
+        logger.info("Habit %s deleted successfully", habit_id)
         return {"message": "Habit deleted successfully"}
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Failed to delete habit: {str(e)}")
+        logger.error("Failed to delete habit: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
@@ -1,4 +1,9 @@
 import os
+import re
+import sys
+import time
+import hashlib
+import argparse
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import logging
@@ -7,59 +12,201 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def run_migrations():
-    try:
-        # Load environment variables
-        load_dotenv()
-        
-        # Get Supabase credentials
-        SUPABASE_URL = os.getenv("SUPABASE_URL")
-        SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # Use service key for migrations
-        
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            raise ValueError("Missing Supabase credentials")
-        
-        logger.info("Initializing Supabase client...")
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
-        # First, create the exec_sql function
-        logger.info("Creating exec_sql function...")
-        function_path = os.path.join(os.path.dirname(__file__), "migrations", "01_create_function.sql")
-        with open(function_path, "r") as f:
-            function_sql = f.read()
-        
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+
+# Versioned migrations are files named NN_description.sql, applied in order.
+# 00_create_function.sql installs exec_sql, which everything else runs
+# through, so it has to be applied once by hand in the Supabase SQL editor.
+MIGRATION_PATTERN = re.compile(r"^(\d+)_(.+)\.sql$")
+BOOTSTRAP_VERSION = "00"
+
+TRACKING_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS public.schema_migrations (
+    version TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMPTZ DEFAULT NOW()
+);
+ALTER TABLE public.schema_migrations ENABLE ROW LEVEL SECURITY;
+NOTIFY pgrst, 'reload schema';
+"""
+
+# Hot queries from routes/ and the index each one is expected to use
+_SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+HOT_QUERIES = [
+    (
+        "entries for a habit in date order",
+        f"SELECT * FROM public.habit_entries WHERE habit_id = '{_SAMPLE_ID}' "
+        f"ORDER BY completed_at, id LIMIT 501",
+        "idx_habit_entries_habit_completed",
+    ),
+    (
+        "entries for a user in a date window",
+        f"SELECT count(*) FROM public.habit_entries WHERE user_id = '{_SAMPLE_ID}' "
+        f"AND completed_at >= '2024-01-01' AND completed_at <= '2024-01-31'",
+        "idx_habit_entries_user_completed",
+    ),
+    (
+        "active habits for a user",
+        f"SELECT * FROM public.habits WHERE user_id = '{_SAMPLE_ID}' AND is_archived = false",
+        "idx_habits_user_archived",
+    ),
+    (
+        "habits for a user in keyset order",
+        f"SELECT * FROM public.habits WHERE user_id = '{_SAMPLE_ID}' "
+        f"ORDER BY created_at, id LIMIT 501",
+        "idx_habits_user_created",
+    ),
+    (
+        "daily rollup for a user in a date window",
+        f"SELECT day, completions FROM public.habit_daily_stats WHERE user_id = '{_SAMPLE_ID}' "
+        f"AND day >= '2024-01-01'",
+        "idx_habit_daily_stats_user_day",
+    ),
+]
+
+
+def get_client() -> Client:
+    load_dotenv()
+
+    # Get Supabase credentials
+    SUPABASE_URL = os.getenv("SUPABASE_URL")
+    SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # Use service key for migrations
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("Missing Supabase credentials")
+
+    logger.info("Initializing Supabase client...")
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+def discover_migrations() -> list:
+    """Return (version, name, sql, checksum) for every versioned migration file, in order."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_PATTERN.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename), "r") as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode()).hexdigest()
+        migrations.append((match.group(1), filename, sql, checksum))
+    migrations.sort(key=lambda m: int(m[0]))
+
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return migrations
+
+
+def get_applied(supabase: Client, retries: int = 5) -> dict:
+    """Map version -> checksum for migrations already recorded in schema_migrations."""
+    for attempt in range(retries):
         try:
-            # Execute the function creation SQL directly
-            supabase._client.postgrest.raw(function_sql)
-            logger.info("Function created successfully!")
-        except Exception as func_error:
-            logger.error(f"Error creating function: {func_error}")
-            raise func_error
-        
-        # Now read and execute the main migration
-        logger.info("Reading main migration file...")
-        migration_path = os.path.join(os.path.dirname(__file__), "migrations", "setup_database.sql")
-        with open(migration_path, "r") as f:
-            migration_sql = f.read()
-        
-        # Execute migration
-        logger.info("Executing migration...")
+            response = supabase.from_('schema_migrations').select("version, checksum").execute()
+            return {row['version']: row['checksum'] for row in response.data}
+        except Exception as e:
+            # PostgREST may not have picked up a freshly created tracking table yet
+            if attempt == retries - 1:
+                raise
+            logger.info(f"Waiting for schema_migrations to become visible: {e}")
+            time.sleep(1)
+
+
+def apply_migration(supabase: Client, version: str, name: str, sql: str, checksum: str) -> None:
+    """Run one migration and record it in the same transaction.
+
+    The body only runs if the version isn't recorded yet, so two runners
+    racing each other can't apply the same migration twice.
+    """
+    if "$migration$" in sql:
+        raise ValueError(f"{name} must not contain the $migration$ quote tag")
+    wrapped = f"""
+DO $runner$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM public.schema_migrations WHERE version = '{version}') THEN
+    EXECUTE $migration${sql}$migration$;
+    INSERT INTO public.schema_migrations (version, name, checksum)
+    VALUES ('{version}', '{name}', '{checksum}');
+  END IF;
+END
+$runner$;
+NOTIFY pgrst, 'reload schema';
+"""
+    supabase.rpc('exec_sql', {'sql': wrapped}).execute()
+
+
+def run_migrations(dry_run: bool = False) -> bool:
+    try:
+        supabase = get_client()
+        migrations = discover_migrations()
+
+        # The tracking table is created through exec_sql, so that has to exist first
         try:
-            # Call the exec_sql function with the migration SQL
-            response = supabase.rpc('exec_sql', {'sql': migration_sql}).execute()
-            logger.info("Migration completed successfully!")
+            supabase.rpc('exec_sql', {'sql': TRACKING_TABLE_SQL}).execute()
+        except Exception as e:
+            logger.error(
+                f"exec_sql is not available ({e}). Apply "
+                f"migrations/{BOOTSTRAP_VERSION}_create_function.sql in the Supabase SQL editor first."
+            )
+            return False
+
+        applied = get_applied(supabase)
+        # The bootstrap function is in place if we got this far
+        pending = [m for m in migrations if m[0] != BOOTSTRAP_VERSION and m[0] not in applied]
+
+        for version, name, sql, checksum in migrations:
+            if version in applied and applied[version] != checksum:
+                logger.warning(f"{name} has changed since it was applied; edits to applied migrations are not re-run")
+
+        if not pending:
+            logger.info("Database is up to date")
             return True
-        except Exception as stmt_error:
-            logger.error(f"Error executing migration: {stmt_error}")
-            raise stmt_error
-        
+
+        for version, name, sql, checksum in pending:
+            if dry_run:
+                logger.info(f"Pending: {name}")
+                continue
+            logger.info(f"Applying {name}...")
+            apply_migration(supabase, version, name, sql, checksum)
+
+        if not dry_run:
+            logger.info(f"Applied {len(pending)} migration(s) successfully!")
+        return True
     except Exception as e:
         logger.error(f"Error running migrations: {str(e)}")
         if hasattr(e, '__dict__'):
             logger.error(f"Error details: {e.__dict__}")
         return False
 
+
+def check_indexes() -> bool:
+    """EXPLAIN the hot queries and confirm each one uses its index."""
+    try:
+        supabase = get_client()
+        ok = True
+        for description, query, index_name in HOT_QUERIES:
+            response = supabase.rpc('explain_plan', {'query': query}).execute()
+            plan = "\n".join(str(line) for line in response.data)
+            if index_name in plan:
+                logger.info(f"OK   {description}: uses {index_name}")
+            else:
+                ok = False
+                logger.error(f"FAIL {description}: expected {index_name}, plan was:\n{plan}")
+        return ok
+    except Exception as e:
+        logger.error(f"Error checking query plans: {str(e)}")
+        return False
+
+
 if __name__ == "__main__":
-    success = run_migrations()
+    parser = argparse.ArgumentParser(description="Apply pending database migrations")
+    parser.add_argument("--dry-run", action="store_true", help="list pending migrations without applying them")
+    parser.add_argument("--check-indexes", action="store_true", help="verify the hot queries use their indexes")
+    args = parser.parse_args()
+
+    success = run_migrations(dry_run=args.dry_run)
+    if success and args.check_indexes:
+        success = check_indexes()
     if not success:
-        exit(1) 
\ No newline at end of file
+        sys.exit(1)
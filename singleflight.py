@@ -0,0 +1,46 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent identical reads into one backend call.
+
+    The first caller for a key starts `fn()`; callers arriving while it is
+    still running await the same result instead of issuing their own
+    query. Nothing is kept once the call finishes, so this never serves
+    stale data by itself. Include the user's data version in the key so
+    reads started after a write don't join a flight that began before it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # Shielded so one caller disconnecting doesn't cancel the others' read
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled() and future.exception() is not None:
+            logger.debug("Coalesced read %s failed: %s", key, future.exception())
+
+    def stats(self) -> Dict[str, int]:
+        return {"started": self.started, "coalesced": self.coalesced}
+
+
+# Shared by the read endpoints
+single_flight = SingleFlight()
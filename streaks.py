@@ -0,0 +1,83 @@
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+
+def parse_day(value) -> Optional[date]:
+    """Turn a `completed_at`/`last_completed_date` value from Supabase into a date."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+def advance_streak(
+    last_completed: Optional[date],
+    streak_count: int,
+    longest_streak: int,
+    entry_date: date,
+) -> Optional[Tuple[int, int, date]]:
+    """Update a habit's streak state for one new check-in in O(1).
+
+    Returns `(streak_count, longest_streak, last_completed_date)`, or `None`
+    when the stored state can't answer the question (back-dated entry, a
+    habit created before `last_completed_date` was tracked, or a streak reset
+    by the nightly reconciliation) and the caller has to fall back to
+    `recompute_streak`.
+    """
+    if last_completed is None:
+        if streak_count:
+            return None
+        return 1, max(longest_streak, 1), entry_date
+    if streak_count == 0 and entry_date - last_completed <= timedelta(days=1):
+        # Reset by reconcile_streaks; the run ending at last_completed is unknown
+        return None
+
+    if entry_date < last_completed:
+        return None
+    if entry_date == last_completed:
+        return streak_count, longest_streak, last_completed
+
+    if entry_date - last_completed == timedelta(days=1):
+        current = streak_count + 1
+    else:
+        current = 1
+    return current, max(longest_streak, current), entry_date
+
+
+def recompute_streak(days: Iterable[date]) -> Tuple[int, int, Optional[date]]:
+    """Rebuild streak state from a habit's full list of completion days.
+
+    Returns `(streak_count, longest_streak, last_completed_date)` where the
+    current streak is the run of consecutive days ending at the latest entry.
+    """
+    current = longest = 0
+    previous = None
+    for day in sorted(set(days)):
+        if previous is not None and day - previous == timedelta(days=1):
+            current += 1
+        else:
+            current = 1
+        longest = max(longest, current)
+        previous = day
+    return current, longest, previous
+
+
+def streak_as_of(
+    streak_count: int,
+    longest_streak: int,
+    last_completed: Optional[date],
+    today: Optional[date] = None,
+) -> Tuple[int, int, Optional[date]]:
+    """Streak state as the nightly reconciliation leaves it on `today`.
+
+    A run whose last day is before yesterday is already broken, so its
+    current streak is 0; the longest streak and last day are kept. Apply
+    this to every state computed from history before it is stored.
+    """
+    today = today or date.today()
+    if last_completed is not None and last_completed < today - timedelta(days=1):
+        return 0, longest_streak, last_completed
+    return streak_count, longest_streak, last_completed